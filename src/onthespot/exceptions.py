@@ -1,2 +1,6 @@
 class EmptySearchResultException(Exception):
     pass
+
+
+class WebApiException(Exception):
+    pass
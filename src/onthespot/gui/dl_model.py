@@ -0,0 +1,252 @@
+import os
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex, QEvent, QRect, QSize
+from PyQt5.QtWidgets import QStyledItemDelegate, QStyle, QStyleOptionProgressBar, QStyleOptionButton, QApplication
+from showinfm import show_in_file_manager
+from ..runtimedata import get_logger, downloaded_data, cancel_list, failed_downloads, downloads_status, download_queue
+
+logger = get_logger('gui.dl_model')
+
+JobRole = Qt.UserRole + 1
+
+
+# Per item state the downloads view shows, kept in downloads_status by media id
+class DownloadJob:
+    __slots__ = ('media_id', 'title', 'by_text', 'type_text', 'status', 'progress',
+                 'can_cancel', 'can_retry', 'can_locate')
+
+    def __init__(self, media_id, title, by_text, type_text):
+        self.media_id = media_id
+        self.title = title
+        self.by_text = by_text
+        self.type_text = type_text
+        self.status = 'Waiting'
+        self.progress = 0
+        self.can_cancel = True
+        self.can_retry = False
+        self.can_locate = False
+
+
+# Downloads table over downloads_status, batches are inserted and updated with one signal each
+class DownloadsModel(QAbstractTableModel):
+    HEADERS = ['MediaID', 'Title', 'By', 'CollectionType', 'Status', 'Progress']
+
+    def __init__(self, parent=None):
+        super(DownloadsModel, self).__init__(parent)
+        self.__ids = []
+        self.__rows = {}
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.__ids)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        job = downloads_status[self.__ids[index.row()]]
+        if role == JobRole:
+            return job
+        if role in (Qt.DisplayRole, Qt.ToolTipRole):
+            column = index.column()
+            if column == 0:
+                return job.media_id
+            if column == 1:
+                return job.title
+            if column == 2:
+                return job.by_text
+            if column == 3:
+                return job.type_text
+            if column == 4:
+                return job.status
+            if column == 5 and role == Qt.ToolTipRole:
+                return f'{job.progress}%'
+        return None
+
+    def contains(self, media_id):
+        return media_id in self.__rows
+
+    def add_jobs(self, jobs):
+        if len(jobs) == 0:
+            return
+        first = len(self.__ids)
+        self.beginInsertRows(QModelIndex(), first, first + len(jobs) - 1)
+        for job in jobs:
+            downloads_status[job.media_id] = job
+            self.__rows[job.media_id] = len(self.__ids)
+            self.__ids.append(job.media_id)
+        self.endInsertRows()
+
+    def apply_progress_batch(self, batch):
+        rows = []
+        for data in batch:
+            row = self.__apply_progress(data)
+            if row is not None:
+                rows.append(row)
+        if rows:
+            # One repaint request for the whole batch, the view only redraws the rows it shows
+            self.dataChanged.emit(self.index(min(rows), 4), self.index(max(rows), 5))
+
+    def apply_progress(self, data):
+        self.apply_progress_batch([data])
+
+    def __apply_progress(self, data):
+        media_id = data[0]
+        status = data[1]
+        progress = data[2]
+        job = downloads_status.get(media_id)
+        if job is None:
+            logger.error(f"Got progress update for media_id '{media_id}' which does not seem to exist !")
+            return None
+        if status is not None:
+            if status.lower() in ['failed', 'cancelled', 'unavailable']:
+                job.can_cancel = False
+                if status.lower() != "unavailable":
+                    job.can_retry = True
+            if 'downloading' == status.lower():
+                job.can_cancel = True
+                job.can_retry = False
+            job.status = status
+            logger.debug(f"Updating status text for download item '{media_id}' to '{status}'")
+        if progress is not None:
+            percent = int((progress[0] / progress[1]) * 100)
+            if percent >= 100:
+                job.can_cancel = False
+                job.can_retry = False
+                job.can_locate = True
+                downloaded_data[media_id] = {
+                    'media_path': data[3],
+                    'media_name': data[4]
+                }
+            job.progress = percent
+            logger.debug(f"Updating progressbar for download item '{media_id}' to '{percent}'%")
+        return self.__rows.get(media_id)
+
+    def __job_changed(self, media_id):
+        row = self.__rows.get(media_id)
+        if row is not None:
+            self.dataChanged.emit(self.index(row, 4), self.index(row, 5))
+
+    def cancel(self, media_id):
+        if not self.__dequeue(media_id):
+            # Already with a worker, it stops at the next chunk
+            cancel_list[media_id] = {}
+        downloads_status[media_id].can_cancel = False
+        self.__job_changed(media_id)
+
+    def __dequeue(self, media_id):
+        # A waiting item is taken out of the queue, so it never reaches a worker
+        item = download_queue.remove(media_id)
+        if item is None:
+            return False
+        logger.info(f'Removed waiting media {media_id} from download queue')
+        failed_downloads[media_id] = item
+        self.__apply_progress([media_id, "Cancelled", [0, 100]])
+        return True
+
+    def retry(self, media_id):
+        # Entries are empty until the worker that cancelled the item has stored it
+        if failed_downloads.get(media_id):
+            job = downloads_status[media_id]
+            job.status = "Waiting"
+            job.can_cancel = True
+            job.can_retry = False
+            download_queue.put(failed_downloads.pop(media_id).copy())
+            self.__job_changed(media_id)
+
+    def locate(self, media_id):
+        if downloaded_data.get(media_id, {}).get('media_path', None):
+            show_in_file_manager(os.path.abspath(downloaded_data[media_id]['media_path']))
+
+    def retry_failed(self):
+        for media_id in list(failed_downloads.keys()):
+            if media_id in downloads_status:
+                self.retry(media_id)
+
+    def cancel_all(self):
+        for media_id, job in downloads_status.items():
+            logger.info(f'Trying to cancel : {media_id}')
+            if self.__dequeue(media_id):
+                continue
+            if job.progress < 95 and media_id not in cancel_list:
+                cancel_list[media_id] = {}
+        if downloads_status:
+            self.dataChanged.emit(self.index(0, 4), self.index(len(self.__ids) - 1, 5))
+
+    def prune(self, predicate):
+        # Drops every job matching predicate with one reset instead of removing rows one by one
+        self.beginResetModel()
+        kept = []
+        for media_id in self.__ids:
+            if predicate(downloads_status[media_id]):
+                downloads_status.pop(media_id)
+            else:
+                kept.append(media_id)
+        self.__ids = kept
+        self.__rows = {media_id: row for row, media_id in enumerate(kept)}
+        self.endResetModel()
+
+
+# Paints progress and cancel/retry/locate buttons of a row and maps clicks to model actions
+class DownloadActionsDelegate(QStyledItemDelegate):
+    BUTTONS = [('can_cancel', 'Cancel'), ('can_retry', 'Retry'), ('can_locate', 'Locate')]
+    BUTTON_WIDTH = 64
+
+    def __layout(self, rect, job):
+        buttons = []
+        right = rect.right()
+        for flag, text in reversed(self.BUTTONS):
+            if getattr(job, flag):
+                buttons.insert(0, (flag, text, QRect(right - self.BUTTON_WIDTH + 1, rect.top(),
+                                                     self.BUTTON_WIDTH, rect.height())))
+                right -= self.BUTTON_WIDTH
+        bar = QRect(rect.left(), rect.top(), right - rect.left() + 1, rect.height())
+        return bar, buttons
+
+    def paint(self, painter, option, index):
+        job = index.data(JobRole)
+        if job is None:
+            return super(DownloadActionsDelegate, self).paint(painter, option, index)
+        style = option.widget.style() if option.widget is not None else QApplication.style()
+        bar_rect, buttons = self.__layout(option.rect.adjusted(1, 1, -1, -1), job)
+        bar = QStyleOptionProgressBar()
+        bar.rect = bar_rect
+        bar.minimum = 0
+        bar.maximum = 100
+        bar.progress = job.progress
+        bar.text = f'{job.progress}%'
+        bar.textVisible = True
+        bar.state = QStyle.State_Enabled
+        style.drawControl(QStyle.CE_ProgressBar, bar, painter, option.widget)
+        for _, text, rect in buttons:
+            button = QStyleOptionButton()
+            button.rect = rect
+            button.text = text
+            button.state = QStyle.State_Enabled | QStyle.State_Raised
+            style.drawControl(QStyle.CE_PushButton, button, painter, option.widget)
+
+    def sizeHint(self, option, index):
+        return QSize(150 + self.BUTTON_WIDTH * 2, 30)
+
+    def editorEvent(self, event, model, option, index):
+        if event.type() != QEvent.MouseButtonRelease or event.button() != Qt.LeftButton:
+            return False
+        job = index.data(JobRole)
+        if job is None:
+            return False
+        _, buttons = self.__layout(option.rect.adjusted(1, 1, -1, -1), job)
+        for flag, _, rect in buttons:
+            if rect.contains(event.pos()):
+                if flag == 'can_cancel':
+                    model.cancel(job.media_id)
+                elif flag == 'can_retry':
+                    model.retry(job.media_id)
+                else:
+                    model.locate(job.media_id)
+                return True
+        return False
@@ -3,76 +3,26 @@ import queue
 import time
 import uuid
 from PyQt5 import uic, QtNetwork, QtGui
-from PyQt5.QtCore import QThread, QDir
-from PyQt5.QtWidgets import QMainWindow, QHeaderView, QLabel, QPushButton, QProgressBar, QTableWidgetItem, QFileDialog
+from PyQt5.QtCore import Qt, QThread, QDir
+from PyQt5.QtWidgets import QMainWindow, QHeaderView, QPushButton, QTableWidgetItem, QFileDialog
 from ..exceptions import EmptySearchResultException
 from ..utils.spotify import search_by_term, get_thumbnail
+from ..utils.library import find_downloaded
+from ..utils.stagequeue import PRIORITY_NORMAL
 from ..utils.utils import name_by_from_sdata, login_user, remove_user, get_url_data, re_init_session
-from ..worker import LoadSessions, ParsingQueueProcessor, MediaWatcher, PlayListMaker, DownloadWorker
-from .dl_progressbtn import DownloadActionsButtons
+from ..worker import LoadSessions, ParsingQueueProcessor, MediaWatcher, PlayListMaker, DownloadWorker, \
+    PostProcessWorker, ProgressAggregator, MetadataPrefetcher, LibraryScanner
+from .dl_model import DownloadJob, DownloadsModel, DownloadActionsDelegate
 from .minidialog import MiniDialog
 from ..otsconfig import config
-from ..runtimedata import get_logger, download_queue, downloads_status, downloaded_data, failed_downloads, cancel_list, \
-    session_pool, thread_pool
+from ..runtimedata import get_logger, download_queue, failed_downloads, cancel_list, \
+    session_pool, thread_pool, postprocess_pool, convert_queue, tagging_queue
 from .thumb_listitem import LabelWithThumb
 from urllib3.exceptions import MaxRetryError, NewConnectionError
 
 logger = get_logger('gui.main_ui')
 
 
-def dl_progress_update(data):
-    media_id = data[0]
-    status = data[1]
-    progress = data[2]
-    try:
-        if status is not None:
-            if status.lower() in ['failed', 'cancelled', 'unavailable']:
-                downloads_status[media_id]["btn"]['cancel'].hide()
-                if status.lower() != "unavailable":
-                    downloads_status[media_id]["btn"]['retry'].show()
-            if 'downloading' == status.lower():
-                downloads_status[media_id]["btn"]['cancel'].show()
-                downloads_status[media_id]["btn"]['retry'].hide()
-            downloads_status[media_id]["status_label"].setText(status)
-            logger.debug(f"Updating status text for download item '{media_id}' to '{status}'")
-        if progress is not None:
-            percent = int((progress[0] / progress[1]) * 100)
-            if percent >= 100:
-                downloads_status[media_id]['btn']['cancel'].hide()
-                downloads_status[media_id]['btn']['retry'].hide()
-                downloads_status[media_id]['btn']['locate'].show()
-                downloaded_data[media_id] = {
-                    'media_path': data[3],
-                    'media_name': data[4]
-                }
-            downloads_status[media_id]["progress_bar"].setValue(percent)
-            logger.debug(f"Updating progressbar for download item '{media_id}' to '{percent}'%")
-    except KeyError:
-        logger.error(f"Why TF we get here ?, Got progressbar update for media_id '{media_id}' "
-                     f"which does not seem to exist !!! -> Valid Status items: "
-                     f"{str([_media_id for _media_id in downloads_status])} "
-                     )
-
-
-def retry_all_failed_downloads():
-    for dl_id in list(failed_downloads.keys()):
-        downloads_status[dl_id]["status_label"].setText("Waiting")
-        downloads_status[dl_id]["btn"]['cancel'].show()
-        downloads_status[dl_id]["btn"]['retry'].hide()
-        download_queue.put(failed_downloads[dl_id].copy())
-        failed_downloads.pop(dl_id)
-
-
-def cancel_all_downloads():
-    for did in downloads_status.keys():
-        logger.info(f'Trying to cancel : {did}')
-        try:
-            if downloads_status[did]['progress_bar'].value() < 95 and did not in cancel_list:
-                cancel_list[did] = {}
-        except (KeyError, RuntimeError):
-            logger.info(f'Cannot cancel media id: {did}, this might have been cleared')
-
-
 class MainWindow(QMainWindow):
 
     def __init__(self, _dialog, start_url=''):
@@ -85,6 +35,11 @@ class MainWindow(QMainWindow):
         self.inp_session_uuid.setText(config.session_uuid)
         logger.info(f"Initialising main window, logging session : {config.session_uuid}")
         self.group_search_items.hide()
+        # Downloads view is backed by a model, rows get no widgets of their own
+        self.__downloads_model = DownloadsModel(self)
+        self.__downloads_delegate = DownloadActionsDelegate(self.tbl_dl_progress)
+        self.tbl_dl_progress.setModel(self.__downloads_model)
+        self.tbl_dl_progress.setItemDelegateForColumn(5, self.__downloads_delegate)
         # Bind button click
         self.bind_button_inputs()
 
@@ -92,6 +47,10 @@ class MainWindow(QMainWindow):
         self.__playlist_maker = None
         self.__media_watcher_thread = None
         self.__media_watcher = None
+        self.__prefetcher = None
+        self.__prefetcher_thread = None
+        self.__library_scanner = None
+        self.__library_scanner_thread = None
         self.__qt_nam = QtNetwork.QNetworkAccessManager()
         # Variable to store data for class use
         self.__users = []
@@ -123,18 +82,31 @@ class MainWindow(QMainWindow):
         self.__session_builder_thread.finished.connect(self.__session_builder_thread.deleteLater)
         self.__session_builder_worker.progress.connect(self.__show_popup_dialog)
         self.__session_builder_thread.start()
-        logger.info("Preparing parsing queue processor")
-        self.__media_parser_thread = QThread()
-        self.__media_parser_worker = ParsingQueueProcessor()
-        self.__media_parser_worker.setup(self.__parsing_queue)
-        self.__media_parser_worker.moveToThread(self.__media_parser_thread)
-        self.__media_parser_thread.started.connect(self.__media_parser_worker.run)
-        self.__media_parser_worker.finished.connect(self.__media_parser_thread.quit)
-        self.__media_parser_worker.finished.connect(self.__media_parser_worker.deleteLater)
-        self.__media_parser_thread.finished.connect(self.__media_parser_thread.deleteLater)
-        self.__media_parser_worker.progress.connect(self.__show_popup_dialog)
-        self.__media_parser_worker.enqueue.connect(self.__add_item_to_downloads)
-        self.__media_parser_thread.start()
+        logger.info("Preparing parsing queue processors")
+        self.__media_parsers = []
+        for i in range(max(1, config.get('parsing_threads'))):
+            parser_thread = QThread()
+            parser_worker = ParsingQueueProcessor()
+            parser_worker.setup(self.__parsing_queue, name=f'PQP_TH-{i}')
+            parser_worker.moveToThread(parser_thread)
+            parser_thread.started.connect(parser_worker.run)
+            parser_worker.finished.connect(parser_thread.quit)
+            parser_worker.finished.connect(parser_worker.deleteLater)
+            parser_thread.finished.connect(parser_thread.deleteLater)
+            parser_worker.progress.connect(self.__show_popup_dialog)
+            parser_worker.enqueue.connect(self.__add_items_to_downloads)
+            parser_thread.start()
+            self.__media_parsers.append([parser_worker, parser_thread])
+        logger.info("Preparing progress aggregator")
+        self.__progress_thread = QThread()
+        self.__progress_aggregator = ProgressAggregator()
+        self.__progress_aggregator.moveToThread(self.__progress_thread)
+        self.__progress_thread.started.connect(self.__progress_aggregator.run)
+        self.__progress_aggregator.finished.connect(self.__progress_thread.quit)
+        self.__progress_aggregator.finished.connect(self.__progress_aggregator.deleteLater)
+        self.__progress_thread.finished.connect(self.__progress_thread.deleteLater)
+        self.__progress_aggregator.batch.connect(self.__downloads_model.apply_progress_batch)
+        self.__progress_thread.start()
 
         # Set the table header properties
         self.set_table_props()
@@ -151,8 +123,8 @@ class MainWindow(QMainWindow):
         self.btn_search_download_all.clicked.connect(lambda x, cat="all": self.__mass_action_dl(cat))
         self.btn_save_adv_config.clicked.connect(self.__update_config)
         self.btn_toggle_advanced.clicked.connect(self.__toggle_advanced)
-        self.btn_progress_retry_all.clicked.connect(retry_all_failed_downloads)
-        self.btn_progress_cancel_all.clicked.connect(cancel_all_downloads)
+        self.btn_progress_retry_all.clicked.connect(self.__downloads_model.retry_failed)
+        self.btn_progress_cancel_all.clicked.connect(self.__downloads_model.cancel_all)
         self.btn_download_root_browse.clicked.connect(self.__select_dir)
         self.inp_search_term.returnPressed.connect(self.__get_search_results)
         self.btn_search_download_tracks.clicked.connect(lambda x, cat="tracks": self.__mass_action_dl(cat))
@@ -182,10 +154,16 @@ class MainWindow(QMainWindow):
         tbl_search_results_headers.setSectionResizeMode(3, QHeaderView.ResizeToContents)
         # Download progress table
         tbl_dl_progress_header = self.tbl_dl_progress.horizontalHeader()
-        tbl_dl_progress_header.setSectionResizeMode(0, QHeaderView.ResizeToContents)
-        tbl_dl_progress_header.setSectionResizeMode(1, QHeaderView.ResizeToContents)
-        tbl_dl_progress_header.setSectionResizeMode(3, QHeaderView.ResizeToContents)
-        tbl_dl_progress_header.setSectionResizeMode(5, QHeaderView.ResizeToContents)
+        tbl_dl_progress_header.setSectionResizeMode(0, QHeaderView.Interactive)
+        tbl_dl_progress_header.setSectionResizeMode(1, QHeaderView.Stretch)
+        tbl_dl_progress_header.setSectionResizeMode(2, QHeaderView.Interactive)
+        tbl_dl_progress_header.setSectionResizeMode(3, QHeaderView.Interactive)
+        tbl_dl_progress_header.setSectionResizeMode(4, QHeaderView.Interactive)
+        tbl_dl_progress_header.setSectionResizeMode(5, QHeaderView.Interactive)
+        tbl_dl_progress_header.resizeSection(5, self.__downloads_delegate.sizeHint(None, None).width())
+        # Fixed row heights, so the view never measures rows it does not show
+        self.tbl_dl_progress.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.tbl_dl_progress.verticalHeader().setDefaultSectionSize(32)
         return True
 
     def __m3u_maker_set(self):
@@ -260,77 +238,63 @@ class MainWindow(QMainWindow):
         else:
             self.group_temp_dl_root.show()
 
-    def __add_item_to_downloads(self, item):
-        # Create progress status
-        if item['item_id'] in downloads_status:
-            # If the item is in download status dictionary, it's not cleared from view
-            logger.info(f'The media: "{item["item_title"]}" ({item["item_id"]}) was already in view')
-            if item['item_id'] in cancel_list:
-                logger.info(f'The media: "{item["item_title"]}" ({item["item_id"]}) was being cancelled, preventing cancellation !')
-                cancel_list.pop(item['item_id'])
-            elif item['item_id'] in failed_downloads:
-                dl_id = item['item_id']
-                logger.info(f'The media: "{item["item_title"]}" ({item["item_id"]}) had failed to download, re-downloading ! !')
-                downloads_status[dl_id]["status_label"].setText("Waiting")
-                downloads_status[dl_id]["btn"]['cancel'].show()
-                downloads_status[dl_id]["btn"]['retry'].hide()
-                download_queue.put(failed_downloads[dl_id].copy())
-                failed_downloads.pop(dl_id)
+    def __add_items_to_downloads(self, items):
+        # Jobs of a whole batch are inserted into the model at once, the view only paints the rows it shows
+        jobs = []
+        batch_ids = set()
+        existing_jobs = []
+        for item in items:
+            if self.__downloads_model.contains(item['item_id']) or item['item_id'] in batch_ids:
+                self.__requeue_item(item)
+                continue
+            batch_ids.add(item['item_id'])
+            jobs.append(DownloadJob(item['item_id'], item['item_title'], item['item_by_text'], item['item_type_text']))
+            # Media found in the library index is finished right away, without any web api or stream request
+            existing = find_downloaded(item['item_id'], item['dl_params']['media_type'],
+                                       item['dl_params']['extra_path_as_root'])
+            if existing is None:
+                download_queue.put(
+                    {
+                        'media_type': item['dl_params']['media_type'],
+                        'media_id': item['item_id'],
+                        'extra_paths': item['dl_params']['extra_paths'],
+                        'force_album_format': config.get('playlist_track_force_album_dir'),
+                        'extra_path_as_root': item['dl_params']['extra_path_as_root'],
+                        'force_album_after_extra_path_as_root': item['dl_params']['force_album_after_extra_path_as_root'],
+                        'm3u_filename': '',
+                        'playlist_name': item['dl_params'].get('playlist_name', ''),
+                        'playlist_owner': item['dl_params'].get('playlist_owner', ''),
+                        'playlist_desc': item['dl_params'].get('playlist_desc', ''),
+                        'priority': item['dl_params'].get('priority', PRIORITY_NORMAL),
+                        'parent_id': item['dl_params'].get('parent_id', '')
+                    }
+                )
             else:
-                logger.info(f'The media: "{item["item_title"]}" ({item["item_id"]}) is already in queue and is being downloaded, ignoring.. !')
-            return None
-        pbar = QProgressBar()
-        pbar.setValue(0)
-        cancel_btn = QPushButton()
-        retry_btn = QPushButton()
-        locate_btn = QPushButton()
-        retry_btn.setText('Retry')
-        cancel_btn.setText('Cancel')
-        locate_btn.setText('Locate')
-        retry_btn.hide()
-        locate_btn.hide()
-        pbar.setMinimumHeight(30)
-        retry_btn.setMinimumHeight(30)
-        cancel_btn.setMinimumHeight(30)
-        status = QLabel(self.tbl_dl_progress)
-        status.setText("Waiting")
-        actions = DownloadActionsButtons(item['item_id'], pbar, cancel_btn, retry_btn, locate_btn)
-        download_queue.put(
-            {
-                'media_type': item['dl_params']['media_type'],
-                'media_id': item['item_id'],
-                'extra_paths': item['dl_params']['extra_paths'],
-                'force_album_format': config.get('playlist_track_force_album_dir'),
-                'extra_path_as_root': item['dl_params']['extra_path_as_root'],
-                'force_album_after_extra_path_as_root': item['dl_params']['force_album_after_extra_path_as_root'],
-                'm3u_filename': '',
-                'playlist_name': item['dl_params'].get('playlist_name', ''),
-                'playlist_owner': item['dl_params'].get('playlist_owner', ''),
-                'playlist_desc': item['dl_params'].get('playlist_desc', '')
+                existing_jobs.append((item['item_id'], existing))
+            logger.info(
+                f"Adding item to download queue -> media_type:{item['dl_params']['media_type']}, "
+                f"media_id: {item['item_id']}, extra_path:{item['dl_params']['extra_paths']}, "
+                f"extra_path_as_root: {item['dl_params']['extra_path_as_root']}, Prefix value: ''")
+        self.__downloads_model.add_jobs(jobs)
+        if existing_jobs:
+            for media_id, existing in existing_jobs:
+                logger.info(f"Media '{media_id}' already exists at '{existing['path']}', skipping download")
+            self.__downloads_model.apply_progress_batch(
+                [[media_id, "Already exists", [100, 100], existing['path'], existing['name']]
+                 for media_id, existing in existing_jobs]
+            )
 
-            }
-        )
-        downloads_status[item['item_id']] = {
-            "status_label": status,
-            "progress_bar": pbar,
-            "btn": {
-                "cancel": cancel_btn,
-                "retry": retry_btn,
-                "locate": locate_btn
-            }
-        }
-        logger.info(
-            f"Adding item to download queue -> media_type:{item['dl_params']['media_type']}, "
-            f"media_id: {item['item_id']}, extra_path:{item['dl_params']['extra_paths']}, "
-            f"extra_path_as_root: {item['dl_params']['extra_path_as_root']}, Prefix value: ''")
-        rows = self.tbl_dl_progress.rowCount()
-        self.tbl_dl_progress.insertRow(rows)
-        self.tbl_dl_progress.setItem(rows, 0, QTableWidgetItem(item['item_id']))
-        self.tbl_dl_progress.setItem(rows, 1, QTableWidgetItem(item['item_title']))
-        self.tbl_dl_progress.setItem(rows, 2, QTableWidgetItem(item['item_by_text']))
-        self.tbl_dl_progress.setItem(rows, 3, QTableWidgetItem(item['item_type_text']))
-        self.tbl_dl_progress.setCellWidget(rows, 4, status)
-        self.tbl_dl_progress.setCellWidget(rows, 5, actions)
+    def __requeue_item(self, item):
+        # The item is still in view, it is either brought back or left alone
+        logger.info(f'The media: "{item["item_title"]}" ({item["item_id"]}) was already in view')
+        if item['item_id'] in cancel_list:
+            logger.info(f'The media: "{item["item_title"]}" ({item["item_id"]}) was being cancelled, preventing cancellation !')
+            cancel_list.pop(item['item_id'])
+        elif item['item_id'] in failed_downloads:
+            logger.info(f'The media: "{item["item_title"]}" ({item["item_id"]}) had failed to download, re-downloading ! !')
+            self.__downloads_model.retry(item['item_id'])
+        else:
+            logger.info(f'The media: "{item["item_title"]}" ({item["item_id"]}) is already in queue and is being downloaded, ignoring.. !')
 
     def __show_popup_dialog(self, txt, btn_hide=False):
         self.__splash_dialog.lb_main.setText(str(txt))
@@ -398,28 +362,92 @@ class MainWindow(QMainWindow):
             self.tbl_sessions.setCellWidget(rows, 4, btn)
         logger.info("Accounts table was populated !")
 
+    def __build_postprocess_threads(self):
+        # Convert stage feeds the tagging stage, tagging stage reports the final status
+        stages = [
+            # ffmpeg is cpu bound, by default run one conversion per core
+            ('convert', config.get('convert_workers') or os.cpu_count() or 1, convert_queue, tagging_queue),
+            ('tag', config.get('tagging_workers'), tagging_queue, None)
+        ]
+        for stage, count, queue_in, queue_out in stages:
+            for i in range(max(1, count)):
+                th_name = f"PP_{stage.upper()}_TH-{i}"
+                if th_name in postprocess_pool:
+                    continue
+                logger.info(f"Spawning post processing thread : {th_name} ")
+                postprocess_pool[th_name] = [PostProcessWorker(), QThread()]
+                postprocess_pool[th_name][0].setup(thread_name=th_name, stage=stage, queue_in=queue_in,
+                                                   queue_out=queue_out)
+                postprocess_pool[th_name][0].moveToThread(postprocess_pool[th_name][1])
+                postprocess_pool[th_name][1].started.connect(postprocess_pool[th_name][0].run)
+                postprocess_pool[th_name][0].finished.connect(postprocess_pool[th_name][1].quit)
+                postprocess_pool[th_name][0].finished.connect(postprocess_pool[th_name][0].deleteLater)
+                postprocess_pool[th_name][1].finished.connect(postprocess_pool[th_name][1].deleteLater)
+                postprocess_pool[th_name][0].progress.connect(self.__progress_aggregator.update,
+                                                              Qt.DirectConnection)
+                postprocess_pool[th_name][1].start()
+
+    def __start_prefetcher(self):
+        if self.__prefetcher is not None:
+            return
+        logger.info("Starting metadata prefetcher thread")
+        self.__prefetcher = MetadataPrefetcher()
+        self.__prefetcher_thread = QThread(parent=self)
+        self.__prefetcher.moveToThread(self.__prefetcher_thread)
+        self.__prefetcher_thread.started.connect(self.__prefetcher.run)
+        self.__prefetcher.finished.connect(self.__prefetcher_thread.quit)
+        self.__prefetcher.finished.connect(self.__prefetcher.deleteLater)
+        self.__prefetcher_thread.finished.connect(self.__prefetcher_thread.deleteLater)
+        self.__prefetcher_thread.start()
+
+    def __start_library_scanner(self):
+        if self.__library_scanner is not None or not config.get('library_index') \
+                or not config.get('library_scan_on_start'):
+            return
+        logger.info("Starting library scanner thread")
+        self.__library_scanner = LibraryScanner()
+        self.__library_scanner_thread = QThread(parent=self)
+        self.__library_scanner.moveToThread(self.__library_scanner_thread)
+        self.__library_scanner_thread.started.connect(self.__library_scanner.run)
+        self.__library_scanner.finished.connect(self.__library_scanner_thread.quit)
+        self.__library_scanner.finished.connect(self.__library_scanner.deleteLater)
+        self.__library_scanner_thread.finished.connect(self.__library_scanner_thread.deleteLater)
+        self.__library_scanner_thread.start()
+
     def __rebuild_threads(self):
-        # Check how many threads can we build till we reach max thread
-        logger.debug(f'Thread builder -> TPool count : {len(thread_pool)}, SPool count : {len(session_pool)}, MaxT : {config.get("max_threads")}')
-        for session_uuid in session_pool.keys():
-            if ( len(thread_pool) < config.get('max_threads') ) and session_uuid not in thread_pool.keys():
-                # We have space for new thread and the session is not used by any thread
-                thread_pool[session_uuid] = [DownloadWorker(), QThread()]
-                logger.info(f"Spawning DL thread using session : {session_uuid} ")
-                thread_pool[session_uuid][0].setup(
-                    thread_name=f"SESSION_DL_TH-{session_uuid}",
+        self.__build_postprocess_threads()
+        self.__start_prefetcher()
+        self.__start_library_scanner()
+        # Check how many threads can we build till we reach max thread, every account gets its n-th stream
+        # before any account gets its n+1-th so the global cap is shared fairly
+        max_threads = config.get('max_threads')
+        streams_per_account = max(1, config.get('max_streams_per_account'))
+        logger.debug(f'Thread builder -> TPool count : {sum(len(w) for w in thread_pool.values())}, '
+                      f'SPool count : {len(session_pool)}, MaxT : {max_threads}, '
+                      f'Streams per account : {streams_per_account}')
+        for slot in range(streams_per_account):
+            for session_uuid in session_pool.keys():
+                workers = thread_pool.setdefault(session_uuid, [])
+                if len(workers) > slot:
+                    continue
+                if sum(len(w) for w in thread_pool.values()) >= max_threads:
+                    logger.debug(f'Session {session_uuid} not used for stream {slot}, resource busy !')
+                    continue
+                # We have space for new thread and the session has a free stream slot
+                worker = [DownloadWorker(), QThread()]
+                workers.append(worker)
+                logger.info(f"Spawning DL thread using session : {session_uuid}, stream : {slot} ")
+                worker[0].setup(
+                    thread_name=f"SESSION_DL_TH-{session_uuid}-{slot}",
                     session_uuid=session_uuid,
                     queue_tracks=download_queue)
-                thread_pool[session_uuid][0].moveToThread(thread_pool[session_uuid][1])
-                thread_pool[session_uuid][1].started.connect(thread_pool[session_uuid][0].run)
-                thread_pool[session_uuid][0].finished.connect(thread_pool[session_uuid][1].quit)
-                thread_pool[session_uuid][0].finished.connect(thread_pool[session_uuid][0].deleteLater)
-                thread_pool[session_uuid][1].finished.connect(thread_pool[session_uuid][1].deleteLater)
-                thread_pool[session_uuid][0].progress.connect(dl_progress_update)
-                thread_pool[session_uuid][0].finished.connect(thread_pool[session_uuid][1].quit)
-                thread_pool[session_uuid][1].start()
-            else:
-                logger.debug(f'Session {session_uuid} not used, resource busy !')
+                worker[0].moveToThread(worker[1])
+                worker[1].started.connect(worker[0].run)
+                worker[0].finished.connect(worker[1].quit)
+                worker[0].finished.connect(worker[0].deleteLater)
+                worker[1].finished.connect(worker[1].deleteLater)
+                worker[0].progress.connect(self.__progress_aggregator.update, Qt.DirectConnection)
+                worker[1].start()
         if len(session_pool) == 0:
             # Display notice that no session is available and threads are not built
             self.__splash_dialog.run("No session available for , login to at least one account !")
@@ -603,7 +631,7 @@ class MainWindow(QMainWindow):
             except (OSError, queue.Empty, MaxRetryError, NewConnectionError, ConnectionError):
                 # Internet disconnected ?
                 logger.error('Search failed Connection error ! Trying to re init parsing account session ! ')
-                re_init_session(session_pool, selected_uuid, wait_connectivity=False)
+                re_init_session(session_pool, selected_uuid, wait_connectivity=False, failed_session=session)
                 return None
             self.__populate_search_results(results)
             self.__last_search_data = results
@@ -729,20 +757,10 @@ class MainWindow(QMainWindow):
                 )
 
     def rem_complete_from_table(self):
-        check_row = 0
-        while check_row < self.tbl_dl_progress.rowCount():
-            did = self.tbl_dl_progress.item(check_row, 0).text()
-            logger.info(f'Removing Row : {check_row} and mediaid: {did}')
-            if did in downloads_status:
-                progress = downloads_status[did]["progress_bar"].value()
-                status = downloads_status[did]["status_label"].text().lower()
-                if progress == 100 or status in ['cancelled', 'unavailable']:
-                    self.tbl_dl_progress.removeRow(check_row)
-                    downloads_status.pop(did)
-                else:
-                    check_row = check_row + 1
-            else:
-                check_row = check_row + 1
+        logger.info('Removing completed, cancelled and unavailable items from view')
+        self.__downloads_model.prune(
+            lambda job: job.progress == 100 or job.status.lower() in ['cancelled', 'unavailable']
+        )
 
     def __send_to_pqp(self, queue_item):
         tmp_dl_val = self.inp_tmp_dl_root.text().strip()
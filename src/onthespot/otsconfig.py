@@ -19,7 +19,9 @@ class Config:
         self.__template_data = {
             "version": 0.5, # Application version
             "max_threads": 1, # Maximum number of thread we can spawn
+            "max_streams_per_account": 1, # Maximum number of parallel downloads using the same account
             "parsing_acc_sn": 1, # Serial number of account that will be used for parsing links
+            "parsing_threads": 4, # Number of links, albums of an artist or episodes of a show parsed at the same time
             "download_root": os.path.join(os.path.expanduser("~"), "Music", "OnTheSpot"), # Root dir for downloads
             "download_delay": 5, # Seconds to wait before next download
             "track_name_formatter": "{artist} - {album} - {name}", # Track name format string
@@ -29,18 +31,54 @@ class Config:
             "watch_bg_for_spotify": 0, # Detect songs playing on spotify desktop client and automatically download the,
             "dl_end_padding_bytes": 167,
             "max_retries": 3, # Number of times to retry before giving up on download
+            "http_pool_size": 16, # Max kept alive connections per host shared by all workers
+            "http_pool_hosts": 8, # Number of hosts to keep connection pools for
+            "http_timeout": 30, # Seconds to wait for web api, lyrics and artwork responses
+            "http_retries": 5, # Number of retries for failed web api, lyrics and artwork requests
+            "entity_cache_size": 5000, # Max tracks, albums and artists kept parsed in memory
+            "entity_cache_ttl": 3600, # Seconds a parsed track, album or artist stays in memory
+            "request_cache_max_mb": 256, # Disk budget for cached web api responses, least recently used are evicted
+            "compact_request_cache": True, # Cache only the fields the app reads, in a compact binary encoding
+            "cache_ttl_catalog": 2592000, # Seconds cached track, album, artist and episode responses stay valid
+            "cache_ttl_playlist": 600, # Seconds cached playlist responses stay valid
+            "cache_ttl_search": 900, # Seconds cached search results stay valid
+            "cache_ttl_default": 86400, # Seconds other cached web api responses stay valid, e.g. artist albums
+            "artwork_mode": "original", # 'original' embeds the source cover untouched, 'convert' re-encodes it
+            "artwork_max_size": 0, # Largest cover width or height in pixels when converting, 0 keeps the source size
+            "artwork_format": "jpeg", # Cover format when converting, 'jpeg' or 'png'
+            "artwork_quality": 90, # Jpeg quality when converting covers
+            "artwork_cache_memory_mb": 64, # Memory kept for ready to embed cover art shared by tracks of an album
+            "artwork_cache_days": 30, # Days an unused cover art file stays in the disk cache
+            "api_batch_window": 0.05, # Seconds to collect track, album and artist ids before a combined web api request
+            "metadata_prefetch_count": 5, # Number of queued tracks to resolve metadata for ahead of download, 0 disables
+            "metadata_prefetch_delay": 0.2, # Seconds to wait between metadata prefetch requests
             "max_search_results": 10, # Number of search results to display of each type
             "media_format": "mp3", # Song track media format
             "podcast_media_format": "mp3", # Podcast track media format
             "force_raw": False, # Skip media conversion and metadata writing
             "force_premium": False, # Set premium flag to always return true
             "chunk_size": 50000, # Chunk size in bytes to download in
+            "adaptive_chunk_size": True, # Grow or shrink chunk size from measured download speed
+            "min_chunk_size": 16384, # Smallest chunk size used by adaptive chunk sizing
+            "chunk_target_latency": 0.25, # Seconds a single chunk read should take with adaptive chunk sizing
+            "write_buffer_size": 1048576, # Bytes buffered in memory before writing downloaded data to disk
+            "resume_partial_downloads": True, # Keep .part files of failed downloads and resume them on retry
+            "part_sync_bytes": 4194304, # Bytes downloaded between updates of the .part resume offset
+            "convert_workers": 0, # Number of threads converting downloaded media with ffmpeg, 0 uses one per cpu core
+            "ffmpeg_threads": 1, # Threads each ffmpeg process may use, 0 lets ffmpeg decide
+            "tagging_workers": 1, # Number of threads writing metadata, thumbnails and lyrics
+            "postprocess_queue_size": 16, # Max files waiting for each post processing stage before downloads pause
+            "progress_update_rate": 10, # Times per second download progress is pushed to the progress table
             "recoverable_fail_wait_delay": 10, # No of seconds to wait before failure that can be retried
             "disable_bulk_dl_notices": True, # Hide popups for bulk download buttons
             "inp_enable_lyrics": True, # Enable lyrics download
             "only_synced_lyrics": False, # Only use synced lyrics
             "create_m3u_playlists": False, # Create m3u based playlist
             "ffmpeg_args": [], # Extra arguments for ffmpeg
+            "library_index": True, # Skip media already found in the download library index without any request
+            "library_scan_on_start": True, # Index files in the download root by their spotify id tag at startup
+            "native_ogg_finalize": True, # Fix up ogg downloads in place instead of remuxing them with ffmpeg
+            "stream_transcode": False, # Pipe the stream straight into ffmpeg instead of converting a temporary file
             "show_search_thumbnails": 1, # Show thumbnails in search view
             "search_thumb_height": 60, # Thumbnail height ( they are of equal width and height )
             "metadata_seperator": ";", # Seperator used for metadata fields that have multiple values
@@ -1,5 +1,7 @@
-from queue import Empty, Queue
+from queue import Empty
 from .otsconfig import config
+from .utils.stagequeue import StageQueue
+from .utils.jobqueue import JobQueue
 import sys
 import os
 import logging
@@ -18,14 +20,17 @@ log_handler = RotatingFileHandler(config.get("_log_file"),
 stdout_handler = logging.StreamHandler(sys.stdout)
 log_handler.setFormatter(log_formatter)
 stdout_handler.setFormatter(log_formatter)
-download_queue = Queue()
+# Keyed by media id, queued items can be looked up, cancelled and reprioritized without reaching a worker
+download_queue = JobQueue()
 thread_pool = {}
+postprocess_pool = {}
 session_pool = {}
 failed_downloads = {}
 cancel_list = {}
 downloads_status = {}
 playlist_m3u_queue = {}
 downloaded_data = {}
+prefetched_metadata = {}
 unavailable = set()
 
 loglevel = int(os.environ.get("LOG_LEVEL", 20))
@@ -41,6 +46,13 @@ def get_logger(name):
 
 logger_ = get_logger("runtimedata")
 
+# Post processing stage queues are bounded so streaming stalls instead of piling up raw files, interactive items
+# are processed first
+convert_queue = StageQueue(maxsize=config.get('postprocess_queue_size'), name='convert',
+                           logger=get_logger("stagequeue.convert"))
+tagging_queue = StageQueue(maxsize=config.get('postprocess_queue_size'), name='tagging',
+                           logger=get_logger("stagequeue.tagging"))
+
 
 def handle_exception(exc_type, exc_value, exc_traceback):
     if issubclass(exc_type, KeyboardInterrupt):
@@ -0,0 +1,103 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from hashlib import md5
+from ..runtimedata import get_logger
+
+logger = get_logger("utils.artwork")
+
+
+class _Fetch:
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+# Encoded artwork by (url, variant), written through to disk with an in-memory LRU,
+# concurrent requests for the same image share one fetch
+class ArtworkCache:
+    def __init__(self, cache_dir, fetch, max_memory_bytes=64 * 1024 * 1024, max_age_days=30):
+        self.cache_dir = cache_dir
+        self.max_memory_bytes = max_memory_bytes
+        self.__fetch = fetch
+        self.__lock = threading.Lock()
+        self.__memory = OrderedDict()
+        self.__memory_bytes = 0
+        self.__inflight = {}
+        os.makedirs(cache_dir, exist_ok=True)
+        self.prune(max_age_days)
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, md5(f'{key[0]}|{key[1]}'.encode()).hexdigest() + '.otart')
+
+    def get(self, url, variant=''):
+        key = (url, variant)
+        with self.__lock:
+            data = self.__memory.get(key)
+            if data is not None:
+                self.__memory.move_to_end(key)
+                return data
+            pending = self.__inflight.get(key)
+            lead = pending is None
+            if lead:
+                pending = _Fetch()
+                self.__inflight[key] = pending
+        if not lead:
+            pending.event.wait()
+            if pending.error is not None:
+                raise pending.error
+            return pending.value
+        try:
+            pending.value = self.__load(key)
+        except Exception as exc:
+            pending.error = exc
+            raise
+        finally:
+            with self.__lock:
+                self.__inflight.pop(key, None)
+                if pending.value is not None:
+                    self.__remember(key, pending.value)
+            pending.event.set()
+        return pending.value
+
+    def __load(self, key):
+        url, variant = key
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as af:
+                data = af.read()
+            # Keeps covers that are still in use clear of prune()
+            os.utime(path)
+            logger.debug(f'Artwork "{url}" found in disk cache')
+            return data
+        except FileNotFoundError:
+            pass
+        logger.debug(f'Artwork "{url}" not cached, fetching')
+        data = self.__fetch(url, variant)
+        tmp_path = f'{path}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as af:
+            af.write(data)
+        os.replace(tmp_path, path)
+        return data
+
+    def __remember(self, key, data):
+        self.__memory[key] = data
+        self.__memory_bytes += len(data)
+        while self.__memory_bytes > self.max_memory_bytes and len(self.__memory) > 1:
+            _, evicted = self.__memory.popitem(last=False)
+            self.__memory_bytes -= len(evicted)
+
+    def prune(self, max_age_days):
+        expiry = time.time() - max_age_days * 86400
+        removed = 0
+        for entry in os.scandir(self.cache_dir):
+            try:
+                if entry.is_file() and entry.stat().st_mtime < expiry:
+                    os.remove(entry.path)
+                    removed += 1
+            except OSError:
+                pass
+        if removed:
+            logger.info(f'Removed {removed} expired artwork cache files')
@@ -0,0 +1,79 @@
+import threading
+import time
+from ..runtimedata import get_logger
+
+logger = get_logger("utils.batching")
+
+
+class _PendingResult:
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+# Merges ids asked for by concurrent callers into multi-id fetch(group, ids) calls of up to 'limit' ids,
+# the first caller waits 'window' seconds and fetches for everyone, missing ids resolve to None
+class BatchResolver:
+    def __init__(self, name, fetch, limit, window=0.05):
+        self.name = name
+        self.__fetch = fetch
+        self.__limit = limit
+        self.__window = window
+        self.__lock = threading.Lock()
+        self.__pending = {}
+        self.__waiting = {}
+        self.__leaders = set()
+
+    def get_many(self, group, ids):
+        results = {}
+        lead = False
+        with self.__lock:
+            for entity_id in ids:
+                key = (group, entity_id)
+                result = self.__waiting.get(key)
+                if result is None:
+                    result = _PendingResult()
+                    self.__waiting[key] = result
+                    self.__pending.setdefault(group, []).append(entity_id)
+                results[entity_id] = result
+            if group not in self.__leaders:
+                self.__leaders.add(group)
+                lead = True
+        if lead:
+            self.__lead(group)
+        resolved = {}
+        for entity_id, result in results.items():
+            result.event.wait()
+            if result.error is not None:
+                raise result.error
+            resolved[entity_id] = result.value
+        return resolved
+
+    def get(self, group, entity_id):
+        return self.get_many(group, [entity_id])[entity_id]
+
+    def __lead(self, group):
+        time.sleep(self.__window)
+        while True:
+            with self.__lock:
+                pending = self.__pending.get(group, [])
+                batch = pending[:self.__limit]
+                del pending[:self.__limit]
+                if len(batch) == 0:
+                    self.__pending.pop(group, None)
+                    self.__leaders.discard(group)
+                    return
+            logger.debug(f'Resolving {len(batch)} {self.name} in one request')
+            values = {}
+            error = None
+            try:
+                values = self.__fetch(group, batch)
+            except Exception as exc:
+                error = exc
+            with self.__lock:
+                for entity_id in batch:
+                    result = self.__waiting.pop((group, entity_id))
+                    result.value = values.get(entity_id)
+                    result.error = error
+                    result.event.set()
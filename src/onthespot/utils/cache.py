@@ -0,0 +1,63 @@
+import threading
+import time
+from collections import OrderedDict
+from ..runtimedata import get_logger
+
+logger = get_logger("utils.cache")
+
+
+# Thread safe LRU of parsed web api entities keyed by (kind, id), entries expire after 'ttl' seconds
+class EntityCache:
+    def __init__(self, max_items=5000, ttl=3600, stats_every=1000):
+        self.max_items = max_items
+        self.ttl = ttl
+        self.__stats_every = stats_every
+        self.__lock = threading.Lock()
+        self.__items = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self.__lock:
+            entry = self.__items.get(key)
+            if entry is not None and entry[0] < time.monotonic():
+                self.__items.pop(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                value = None
+            else:
+                self.__items.move_to_end(key)
+                self.hits += 1
+                value = entry[1]
+            lookups = self.hits + self.misses
+        if lookups % self.__stats_every == 0:
+            logger.info(f'Entity cache stats: {self.stats()}')
+        return value
+
+    def put(self, key, value):
+        if value is None:
+            return value
+        with self.__lock:
+            self.__items[key] = (time.monotonic() + self.ttl, value)
+            self.__items.move_to_end(key)
+            while len(self.__items) > self.max_items:
+                self.__items.popitem(last=False)
+                self.evictions += 1
+        return value
+
+    def clear(self):
+        with self.__lock:
+            self.__items.clear()
+
+    def stats(self):
+        with self.__lock:
+            lookups = self.hits + self.misses
+            return {
+                'items': len(self.__items),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0
+            }
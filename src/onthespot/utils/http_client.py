@@ -0,0 +1,38 @@
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from ..otsconfig import config
+from ..runtimedata import get_logger
+
+logger = get_logger("utils.http_client")
+
+
+def build_http_session():
+    # Keep-alive connections are pooled per host and shared by every worker thread
+    retries = Retry(
+        total=config.get('http_retries'),
+        backoff_factor=0.5,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=['GET'],
+        respect_retry_after_header=True,
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(
+        pool_connections=config.get('http_pool_hosts'),
+        pool_maxsize=config.get('http_pool_size'),
+        max_retries=retries
+    )
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    logger.info(f"HTTP client ready, pool size per host: {config.get('http_pool_size')}, "
+                f"retries: {config.get('http_retries')}, timeout: {config.get('http_timeout')}")
+    return session
+
+
+http_session = build_http_session()
+
+
+def http_get(url, **kwargs):
+    kwargs.setdefault('timeout', config.get('http_timeout'))
+    return http_session.get(url, **kwargs)
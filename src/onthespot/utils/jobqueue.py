@@ -0,0 +1,124 @@
+import threading
+import time
+from collections import OrderedDict
+from queue import Empty
+from .stagequeue import PRIORITY_NORMAL
+
+
+# Download queue keyed by media id, served by priority and round-robin between parent jobs,
+# lookups, removal, reprioritizing and dedup never scan the queue
+class JobQueue:
+    def __init__(self):
+        self.mutex = threading.Lock()
+        self.not_empty = threading.Condition(self.mutex)
+        self.__classes = {}
+        self.__index = {}
+
+    def __contains__(self, media_id):
+        with self.mutex:
+            return media_id in self.__index
+
+    def qsize(self):
+        with self.mutex:
+            return len(self.__index)
+
+    def empty(self):
+        return self.qsize() == 0
+
+    def put(self, item):
+        # Never blocks, the queue is unbounded. Returns False when the media is already waiting, the waiting item
+        # keeps the higher of both priorities
+        priority = item.get('priority', PRIORITY_NORMAL)
+        with self.mutex:
+            waiting = self.__index.get(item['media_id'])
+            if waiting is not None:
+                if priority < waiting[0]:
+                    self.__move(item['media_id'], priority)
+                return False
+            self.__insert(item, priority)
+            self.not_empty.notify()
+            return True
+
+    def get(self, block=True, timeout=None):
+        with self.not_empty:
+            if not block:
+                if not self.__index:
+                    raise Empty
+            elif timeout is None:
+                while not self.__index:
+                    self.not_empty.wait()
+            else:
+                end = time.monotonic() + timeout
+                while not self.__index:
+                    remaining = end - time.monotonic()
+                    if remaining <= 0:
+                        raise Empty
+                    self.not_empty.wait(remaining)
+            priority = min(self.__classes)
+            parents = self.__classes[priority]
+            parent_id, waiting = next(iter(parents.items()))
+            media_id, item = waiting.popitem(last=False)
+            del self.__index[media_id]
+            # The parent goes to the back of its priority, the next get() serves another one
+            parents.pop(parent_id)
+            if waiting:
+                parents[parent_id] = waiting
+            self.__prune(priority, None)
+            return item
+
+    def remove(self, media_id):
+        # Takes a waiting item out of the queue, returns it or None if it is not waiting
+        with self.mutex:
+            if media_id not in self.__index:
+                return None
+            return self.__pop(media_id)
+
+    def reprioritize(self, media_id, priority):
+        with self.mutex:
+            waiting = self.__index.get(media_id)
+            if waiting is None:
+                return False
+            if waiting[0] != priority:
+                self.__move(media_id, priority)
+            return True
+
+    def peek(self, count):
+        # Next 'count' items in the order get() would return them
+        items = []
+        with self.mutex:
+            for priority in sorted(self.__classes):
+                turns = [iter(waiting.values()) for waiting in self.__classes[priority].values()]
+                while turns:
+                    for turn in list(turns):
+                        if len(items) >= count:
+                            return items
+                        item = next(turn, None)
+                        if item is None:
+                            turns.remove(turn)
+                        else:
+                            items.append(item)
+        return items
+
+    def __insert(self, item, priority):
+        parent_id = item.get('parent_id') or item['media_id']
+        parents = self.__classes.setdefault(priority, OrderedDict())
+        parents.setdefault(parent_id, OrderedDict())[item['media_id']] = item
+        self.__index[item['media_id']] = (priority, parent_id)
+
+    def __pop(self, media_id):
+        priority, parent_id = self.__index.pop(media_id)
+        item = self.__classes[priority][parent_id].pop(media_id)
+        self.__prune(priority, parent_id)
+        return item
+
+    def __prune(self, priority, parent_id):
+        parents = self.__classes[priority]
+        if parent_id is not None and not parents[parent_id]:
+            del parents[parent_id]
+        if not parents:
+            del self.__classes[priority]
+
+    def __move(self, media_id, priority):
+        item = self.__pop(media_id)
+        item['priority'] = priority
+        self.__insert(item, priority)
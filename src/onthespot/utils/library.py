@@ -0,0 +1,145 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+import traceback
+import music_tag
+from ..otsconfig import config
+from ..runtimedata import get_logger
+
+logger = get_logger("utils.library")
+
+MEDIA_EXTENSIONS = {'.mp3', '.ogg', '.m4a', '.flac', '.wav', '.opus', '.aac'}
+COMMENT_ID = re.compile(r'id\[spotify\.com:(track|episode):([0-9A-Za-z]+)\]')
+
+
+# Downloaded files by the spotify id in their comment tag, size and mtime let rescans skip unchanged files
+class LibraryIndex:
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.__local = threading.local()
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        conn = self.connection()
+        conn.execute('PRAGMA journal_mode=WAL')
+        with conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS files ('
+                'path TEXT PRIMARY KEY, media_id TEXT, media_type TEXT, name TEXT, '
+                'size INTEGER NOT NULL, mtime REAL NOT NULL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS files_media_id ON files (media_id)')
+
+    def connection(self):
+        conn = getattr(self.__local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self.__local.conn = conn
+        return conn
+
+    def get(self, media_id, extension=None):
+        # Returns {'path', 'name'} of an existing file with the id, rows of moved or deleted files are dropped
+        conn = self.connection()
+        rows = conn.execute('SELECT path, name, size FROM files WHERE media_id = ?', (media_id,)).fetchall()
+        for path, name, size in rows:
+            if extension is not None and os.path.splitext(path)[1].lower() != extension:
+                continue
+            try:
+                if os.path.getsize(path) == size:
+                    return {'path': path, 'name': name}
+            except OSError:
+                pass
+            with conn:
+                conn.execute('DELETE FROM files WHERE path = ?', (path,))
+        return None
+
+    def add(self, media_id, media_type, path, name):
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        conn = self.connection()
+        with conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO files (path, media_id, media_type, name, size, mtime) VALUES (?, ?, ?, ?, ?, ?)',
+                (path, media_id, media_type, name, stat.st_size, stat.st_mtime)
+            )
+
+    def scan(self, root, should_stop=None, batch_size=200):
+        # Indexes every media file under root by the comment tag that set_audio_tags writes
+        root = os.path.abspath(root)
+        logger.info(f'Scanning library at "{root}"')
+        started = time.time()
+        conn = self.connection()
+        known = {
+            path: (size, mtime) for path, size, mtime in conn.execute('SELECT path, size, mtime FROM files')
+            if path.startswith(root + os.sep)
+        }
+        seen = set()
+        rows = []
+        indexed = 0
+        for dir_path, _, file_names in os.walk(root):
+            if should_stop is not None and should_stop():
+                logger.warning('Library scan stopped before completion')
+                return indexed
+            for file_name in file_names:
+                # Skip temporary files of running conversions
+                if file_name.startswith('.~') or os.path.splitext(file_name)[1].lower() not in MEDIA_EXTENSIONS:
+                    continue
+                path = os.path.join(dir_path, file_name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                seen.add(path)
+                if known.get(path) == (stat.st_size, stat.st_mtime):
+                    continue
+                rows.append((path,) + self.read_id(path) + (os.path.splitext(file_name)[0], stat.st_size, stat.st_mtime))
+                if len(rows) >= batch_size:
+                    indexed += self.__store(rows)
+        indexed += self.__store(rows)
+        removed = [(path,) for path in known if path not in seen]
+        with conn:
+            conn.executemany('DELETE FROM files WHERE path = ?', removed)
+        logger.info(f'Library scan done in {round(time.time() - started, 1)}s, {indexed} files (re)indexed, '
+                    f'{len(removed)} missing files removed')
+        return indexed
+
+    def read_id(self, path):
+        try:
+            comment = str(music_tag.load_file(path)['comment'])
+        except Exception:
+            logger.debug(f'Could not read tags of "{path}"')
+            return None, None
+        match = COMMENT_ID.search(comment)
+        if match is None:
+            return None, None
+        return match.group(2), match.group(1)
+
+    def __store(self, rows):
+        conn = self.connection()
+        with conn:
+            conn.executemany(
+                'INSERT OR REPLACE INTO files (path, media_id, media_type, name, size, mtime) VALUES (?, ?, ?, ?, ?, ?)',
+                rows
+            )
+        count = len(rows)
+        rows.clear()
+        return count
+
+
+library_index = LibraryIndex(os.path.join(config.get('_cache_dir'), 'library.db'))
+
+
+def find_downloaded(media_id, media_type, extra_path_as_root=False):
+    # Indexed copy in the format a download would produce now, downloads sent to another root are never skipped
+    if not config.get('library_index') or extra_path_as_root:
+        return None
+    if media_type == 'episode':
+        extension = '.' + config.get('podcast_media_format', 'mp3')
+    else:
+        extension = '.ogg' if config.get('force_raw') else '.' + config.get('media_format')
+    try:
+        return library_index.get(media_id, extension.lower())
+    except Exception:
+        logger.error(f'Library index lookup failed for {media_id}: {traceback.format_exc()}')
+        return None
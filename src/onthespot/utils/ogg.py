@@ -0,0 +1,100 @@
+import os
+import struct
+from ..runtimedata import get_logger
+
+logger = get_logger("utils.ogg")
+
+# capture pattern, version, header type, granule position, serial, page sequence, crc, segment count
+PAGE_HEADER = struct.Struct('<4sBBqIIIB')
+FLAG_EOS = 0x04
+
+
+def _crc_table():
+    table = []
+    for i in range(256):
+        crc = i << 24
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x04c11db7) if crc & 0x80000000 else crc << 1
+        table.append(crc & 0xffffffff)
+    return table
+
+
+CRC_TABLE = _crc_table()
+
+
+def page_crc(page):
+    # Ogg uses a non reflected crc32 with zero init and no final xor, zlib.crc32 can not be used
+    crc = 0
+    for byte in page:
+        crc = ((crc << 8) & 0xffffffff) ^ CRC_TABLE[((crc >> 24) ^ byte) & 0xff]
+    return crc
+
+
+def scan_pages(data, start):
+    # Returns (offset, length) of every complete page, stops at trailing padding or a truncated page
+    pages = []
+    offset = start
+    while offset + PAGE_HEADER.size <= len(data):
+        capture, version, _, _, _, _, _, segments = PAGE_HEADER.unpack_from(data, offset)
+        if capture != b'OggS' or version != 0:
+            break
+        table_end = offset + PAGE_HEADER.size + segments
+        if table_end > len(data):
+            break
+        length = PAGE_HEADER.size + segments + sum(data[offset + PAGE_HEADER.size:table_end])
+        if offset + length > len(data):
+            break
+        pages.append((offset, length))
+        offset += length
+    return pages
+
+
+# Makes a raw spotify ogg stream a valid file without remuxing: trims junk and partial pages,
+# renumbers pages and marks the last one end of stream
+def finalize_ogg(filename):
+    with open(filename, 'rb') as ogg_file:
+        data = bytearray(ogg_file.read())
+    start = data.find(b'OggS')
+    if start < 0:
+        raise ValueError(f'No ogg page found in "{filename}"')
+    pages = scan_pages(data, start)
+    if len(pages) == 0:
+        raise ValueError(f'No complete ogg page found in "{filename}"')
+    end = pages[-1][0] + pages[-1][1]
+
+    changed = []
+    next_sequence = {}
+    last_granule = {}
+    for index, (offset, length) in enumerate(pages):
+        _, _, header_type, granule, serial, sequence, _, _ = PAGE_HEADER.unpack_from(data, offset)
+        new_header_type = header_type
+        new_granule = granule
+        new_sequence = next_sequence.get(serial, sequence)
+        next_sequence[serial] = new_sequence + 1
+        if index == len(pages) - 1:
+            new_header_type |= FLAG_EOS
+            if granule == -1:
+                # No packet ends on the last page, use the position of the last one that did
+                new_granule = last_granule.get(serial, 0)
+        if granule != -1:
+            last_granule[serial] = granule
+        if (new_header_type, new_granule, new_sequence) != (header_type, granule, sequence):
+            struct.pack_into('<BqII', data, offset + 5, new_header_type, new_granule, serial, new_sequence)
+            struct.pack_into('<I', data, offset + 22, 0)
+            struct.pack_into('<I', data, offset + 22, page_crc(memoryview(data)[offset:offset + length]))
+            changed.append((offset, length))
+
+    if start > 0:
+        tmp_name = filename + '.~ogg'
+        with open(tmp_name, 'wb') as ogg_file:
+            ogg_file.write(memoryview(data)[start:end])
+        os.replace(tmp_name, filename)
+    else:
+        with open(filename, 'r+b') as ogg_file:
+            for offset, length in changed:
+                ogg_file.seek(offset)
+                ogg_file.write(memoryview(data)[offset:offset + length])
+            ogg_file.truncate(end)
+    logger.info(f'Finalized ogg "{filename}": {len(pages)} pages, {len(changed)} rewritten, '
+                f'{start} leading and {len(data) - end} trailing bytes removed')
+    return len(pages)
@@ -0,0 +1,33 @@
+import marshal
+
+# Bump when a projection drops a field the app starts reading, older records then simply count as misses
+RECORD_MAGIC = b'OTR1'
+
+
+# Keeps only the keys in spec, None keeps a value as is and a nested spec applies to dicts and list items
+def project(data, spec):
+    if isinstance(data, list):
+        return [project(element, spec) for element in data]
+    if not isinstance(data, dict):
+        return data
+    projected = {}
+    for key, sub_spec in spec.items():
+        if key in data:
+            projected[key] = data[key] if sub_spec is None else project(data[key], sub_spec)
+    return projected
+
+
+def encode_record(data):
+    return RECORD_MAGIC + marshal.dumps(data)
+
+
+def is_record(body):
+    return isinstance(body, bytes) and body.startswith(RECORD_MAGIC)
+
+
+def decode_record(body):
+    # Raises ValueError for records written by an incompatible interpreter
+    try:
+        return marshal.loads(body[len(RECORD_MAGIC):])
+    except (EOFError, TypeError) as exc:
+        raise ValueError(f'Bad cache record: {exc}')
@@ -0,0 +1,211 @@
+import os
+import sqlite3
+import threading
+import time
+import traceback
+from ..runtimedata import get_logger
+
+logger = get_logger("utils.request_store")
+
+
+# Web api response cache in one SQLite database, expired entries are misses and
+# least recently used entries are evicted past 'max_bytes'
+class RequestStore:
+    SCHEMA_VERSION = 1
+
+    def __init__(self, db_path, legacy_dir=None, max_bytes=0, stats_every=1000):
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self.__stats_every = stats_every
+        self.__local = threading.local()
+        self.__lock = threading.Lock()
+        self.__evict_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        conn = self.connection()
+        conn.execute('PRAGMA journal_mode=WAL')
+        self.__upgrade_schema(conn)
+        self.__total_bytes = conn.execute('SELECT COALESCE(SUM(size), 0) FROM requests').fetchone()[0]
+        self.__evict()
+        # Set once old cache files are imported, reads and writes do not wait for it, legacy entries are misses until then
+        self.migrated = threading.Event()
+        if legacy_dir is not None and os.path.isdir(legacy_dir):
+            threading.Thread(target=self.migrate, args=(legacy_dir,), name='RequestStoreMigration', daemon=True).start()
+        else:
+            self.migrated.set()
+
+    def __upgrade_schema(self, conn):
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+        with conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS requests ('
+                'key TEXT PRIMARY KEY, url TEXT NOT NULL, body TEXT NOT NULL, stored_at REAL NOT NULL)'
+            )
+            if version < 1:
+                conn.execute('ALTER TABLE requests ADD COLUMN size INTEGER NOT NULL DEFAULT 0')
+                conn.execute('ALTER TABLE requests ADD COLUMN accessed_at REAL NOT NULL DEFAULT 0')
+                conn.execute('UPDATE requests SET size = LENGTH(CAST(body AS BLOB)), accessed_at = stored_at')
+                conn.execute('CREATE INDEX IF NOT EXISTS requests_accessed_at ON requests (accessed_at)')
+            conn.execute(f'PRAGMA user_version = {self.SCHEMA_VERSION}')
+
+    def connection(self):
+        conn = getattr(self.__local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self.__local.conn = conn
+        return conn
+
+    def get(self, key, max_age=None):
+        conn = self.connection()
+        row = conn.execute('SELECT body, stored_at, accessed_at FROM requests WHERE key = ?', (key,)).fetchone()
+        now = time.time()
+        value = None
+        with self.__lock:
+            if row is None:
+                self.misses += 1
+            elif max_age is not None and row[1] + max_age < now:
+                self.misses += 1
+                self.expired += 1
+            else:
+                self.hits += 1
+                value = row[0]
+            lookups = self.hits + self.misses
+        if value is not None and row[2] + 60 < now:
+            # Access times only order eviction, refreshing them once a minute keeps hits read only
+            with conn:
+                conn.execute('UPDATE requests SET accessed_at = ? WHERE key = ?', (now, key))
+        if lookups % self.__stats_every == 0:
+            logger.info(f'Request cache stats: {self.stats()}')
+        return value
+
+    def put(self, key, url, body):
+        size = len(body) if isinstance(body, bytes) else len(body.encode('utf-8'))
+        now = time.time()
+        conn = self.connection()
+        with conn:
+            row = conn.execute('SELECT size FROM requests WHERE key = ?', (key,)).fetchone()
+            conn.execute(
+                'INSERT OR REPLACE INTO requests (key, url, body, stored_at, size, accessed_at) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (key, url, body, now, size, now)
+            )
+        with self.__lock:
+            self.__total_bytes += size - (row[0] if row is not None else 0)
+            over_budget = 0 < self.max_bytes < self.__total_bytes
+        if over_budget:
+            self.__evict()
+
+    def delete(self, key):
+        conn = self.connection()
+        with conn:
+            row = conn.execute('SELECT size FROM requests WHERE key = ?', (key,)).fetchone()
+            conn.execute('DELETE FROM requests WHERE key = ?', (key,))
+        if row is not None:
+            with self.__lock:
+                self.__total_bytes -= row[0]
+
+    def __evict(self, batch_size=200):
+        # One thread evicts at a time, writers that find it busy just carry on
+        if self.max_bytes <= 0 or not self.__evict_lock.acquire(blocking=False):
+            return
+        try:
+            self.__evict_lru(batch_size)
+        finally:
+            self.__evict_lock.release()
+
+    def __evict_lru(self, batch_size):
+        target = self.max_bytes * 0.9
+        conn = self.connection()
+        while True:
+            with self.__lock:
+                if self.__total_bytes <= target:
+                    return
+            with conn:
+                rows = conn.execute(
+                    'SELECT key, size FROM requests ORDER BY accessed_at LIMIT ?', (batch_size,)
+                ).fetchall()
+                if len(rows) == 0:
+                    return
+                conn.executemany('DELETE FROM requests WHERE key = ?', [(row[0],) for row in rows])
+            with self.__lock:
+                self.__total_bytes -= sum(row[1] for row in rows)
+                self.evictions += len(rows)
+            logger.debug(f'Evicted {len(rows)} request cache entries')
+
+    def stats(self):
+        with self.__lock:
+            lookups = self.hits + self.misses
+            return {
+                'bytes': self.__total_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'expired': self.expired,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0
+            }
+
+    def migrate(self, legacy_dir, batch_size=500):
+        # One time import of the old one file per request cache, files are removed once their batch is committed
+        # and the emptied directory is removed, so later starts find nothing to migrate
+        if self.migrated.is_set():
+            return
+        try:
+            self.__migrate(legacy_dir, batch_size)
+        except Exception:
+            logger.error(f'Request cache migration failed: {traceback.format_exc()}')
+        finally:
+            self.migrated.set()
+
+    def __migrate(self, legacy_dir, batch_size):
+        logger.info(f'Migrating request cache files from "{legacy_dir}" to "{self.db_path}"')
+        migrated = 0
+        rows = []
+        paths = []
+        for entry in os.scandir(legacy_dir):
+            if not entry.name.endswith('.otcache') or not entry.is_file():
+                continue
+            try:
+                with open(entry.path, 'r', encoding='utf-8') as cf:
+                    body = cf.read()
+            except (OSError, UnicodeDecodeError):
+                logger.warning(f'Dropping unreadable request cache file "{entry.path}"')
+                try:
+                    os.remove(entry.path)
+                except OSError:
+                    pass
+                continue
+            # The original url is not known for old entries
+            mtime = entry.stat().st_mtime
+            rows.append((entry.name[:-len('.otcache')], '', body, mtime, len(body.encode('utf-8')), mtime))
+            paths.append(entry.path)
+            if len(rows) >= batch_size:
+                migrated += self.__import_batch(rows, paths)
+        migrated += self.__import_batch(rows, paths)
+        conn = self.connection()
+        with self.__lock:
+            self.__total_bytes = conn.execute('SELECT COALESCE(SUM(size), 0) FROM requests').fetchone()[0]
+        self.__evict()
+        try:
+            os.rmdir(legacy_dir)
+        except OSError:
+            logger.warning(f'Legacy request cache dir "{legacy_dir}" is not empty, leaving it in place')
+        logger.info(f'Migrated {migrated} request cache files')
+
+    def __import_batch(self, rows, paths):
+        conn = self.connection()
+        with conn:
+            # Rows written since the migration started are newer and win
+            conn.executemany(
+                'INSERT OR IGNORE INTO requests (key, url, body, stored_at, size, accessed_at) VALUES (?, ?, ?, ?, ?, ?)',
+                rows
+            )
+        for path in paths:
+            os.remove(path)
+        count = len(rows)
+        rows.clear()
+        paths.clear()
+        return count
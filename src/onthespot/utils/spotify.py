@@ -1,9 +1,8 @@
 import string
 import subprocess
+import traceback
 from ..exceptions import *
-import requests.adapters
 from ..otsconfig import config
-import requests
 import json
 import music_tag
 import os
@@ -12,23 +11,37 @@ import re
 from PIL import Image
 from io import BytesIO
 from hashlib import md5
+from concurrent.futures import ThreadPoolExecutor
 from ..runtimedata import get_logger
+from .batching import BatchResolver
+from .cache import EntityCache
+from .artwork import ArtworkCache
+from .ogg import finalize_ogg
+from .request_store import RequestStore
+from .records import project, encode_record, decode_record, is_record
+from .http_client import http_get
 from librespot.audio.decoders import AudioQuality
 
 logger = get_logger("spotutils")
-requests.adapters.DEFAULT_RETRIES = 10
+request_store = RequestStore(os.path.join(config.get('_cache_dir'), 'reqcache.db'),
+                             legacy_dir=os.path.join(config.get('_cache_dir'), 'reqcache'),
+                             max_bytes=config.get('request_cache_max_mb') * 1024 * 1024)
+entity_cache = EntityCache(max_items=config.get('entity_cache_size'), ttl=config.get('entity_cache_ttl'))
 
 def get_artist_albums(session, artist_id):
     logger.info(f"Get albums for artist by id '{artist_id}'")
-    access_token = session.tokens().get("user-read-email")
-    resp = make_call(f'https://api.spotify.com/v1/artists/{artist_id}/albums?include_groups=album,single', token=access_token)
-    return [resp['items'][i]['id'] for i in range(len(resp['items']))]
+    albums = entity_cache.get(('artist_albums', artist_id))
+    if albums is None:
+        access_token = session.tokens().get("user-read-email")
+        resp = make_call(f'https://api.spotify.com/v1/artists/{artist_id}/albums?include_groups=album,single', token=access_token)
+        albums = entity_cache.put(('artist_albums', artist_id), [resp['items'][i]['id'] for i in range(len(resp['items']))])
+    return list(albums)
 
 
 def get_playlist_data(session, playlist_id):
     logger.info(f"Get playlist dump for '{playlist_id}'")
     access_token = session.tokens().get("user-read-email")
-    resp = make_call(f'https://api.spotify.com/v1/playlists/{playlist_id}', token=access_token, no_cache=True)
+    resp = make_call(f'https://api.spotify.com/v1/playlists/{playlist_id}', token=access_token)
     return sanitize_data(resp['name']), sanitize_data(resp['owner']['display_name']), sanitize_data(resp['description']), resp['external_urls']['spotify']
 
 
@@ -38,7 +51,7 @@ def get_track_lyrics(session, track_id, metadata, forced_synced):
         params = 'format=json&market=from_token'
         access_token = session.tokens().get("user-read-email")
         headers = {'Authorization': f'Bearer {access_token}'}
-        lyrics_json_req = requests.get(
+        lyrics_json_req = http_get(
             f'https://spclient.wg.spotify.com/lyrics/v1/track/{track_id}',
             params=params,
             headers=headers
@@ -84,17 +97,16 @@ def get_track_lyrics(session, track_id, metadata, forced_synced):
     return None if len(lyrics) <= 2 else '\n'.join(lyrics)
 
 
-def get_tracks_from_playlist(session, playlist_id):
+def get_tracks_from_playlist(session, playlist_id, start_url=None):
+    # Yields (items, next page url) page by page so callers can enqueue before the whole playlist is fetched and
+    # resume an interrupted read from start_url
     logger.info(f"Get tracks from playlist by id '{playlist_id}'")
-    songs = []
     access_token = session.tokens().get("user-read-email")
-    headers = {'Authorization': f'Bearer {access_token}'}
-    url = f'https://api.spotify.com/v1/playlists/{playlist_id}/tracks'
+    url = start_url or f'https://api.spotify.com/v1/playlists/{playlist_id}/tracks'
     while url:
         resp = make_call(url, token=access_token)
-        songs.extend(resp['items'])
+        yield resp['items'], resp['next']
         url = resp['next']
-    return songs
 
 
 def sanitize_data(value, allow_path_separators=False, escape_quotes=False):
@@ -131,10 +143,7 @@ def sanitize_data(value, allow_path_separators=False, escape_quotes=False):
 def get_album_name(session, album_id):
     logger.info(f"Get album info from album by id ''{album_id}'")
     access_token = session.tokens().get("user-read-email")
-    resp = make_call(
-        f'https://api.spotify.com/v1/albums/{album_id}',
-        token=access_token
-        )
+    resp = get_entities(access_token, 'albums', [album_id])[album_id]
     if m := re.search(r'(\d{4})', resp['release_date']):
         return resp['artists'][0]['name'],\
             m.group(1), sanitize_data(resp['name']),\
@@ -146,7 +155,12 @@ def get_album_name(session, album_id):
 
 
 def get_album_tracks(session, album_id):
+    # Yields the album tracks page by page, a fully read album is kept in the entity cache as a single page
     logger.info(f"Get tracks from album by id '{album_id}'")
+    songs = entity_cache.get(('album_tracks', album_id))
+    if songs is not None:
+        yield list(songs)
+        return
     access_token = session.tokens().get("user-read-email")
     songs = []
     offset = 0
@@ -166,50 +180,76 @@ def get_album_tracks(session, album_id):
             )
         offset += limit
         songs.extend(resp['items'])
+        yield resp['items']
 
         if len(resp['items']) < limit:
             break
-    return songs
+    entity_cache.put(('album_tracks', album_id), songs)
+
+
+def build_ffmpeg_command(input_path, filename, quality):
+    target_path = Path(filename)
+    bitrate = "320k" if quality == AudioQuality.VERY_HIGH else "160k"
+    # Prepare default parameters
+    command = [
+        config.get('_ffmpeg_bin_path'),
+        '-i', input_path
+    ]
+    # If the media format is set to ogg, just correct the downloaded file
+    # and add tags
+    if target_path.suffix == '.ogg':
+        command = command + ['-c', 'copy']
+    else:
+        command = command + ['-ar', '44100', '-ac', '2', '-b:a', bitrate]
+    if config.get('ffmpeg_threads') > 0:
+        # Parallelism comes from the convert pool, keep each ffmpeg from taking every core
+        command = command + ['-threads', str(config.get('ffmpeg_threads'))]
+    if int(os.environ.get('SHOW_FFMPEG_OUTPUT', 0)) == 0:
+        command = command + \
+            ['-loglevel', 'error', '-hide_banner', '-nostats']
+    # Add user defined parameters
+    for param in config.get('ffmpeg_args'):
+        command.append(param)
+    # Add output parameter at last
+    command.append(
+        sanitize_data(
+            filename,
+            allow_path_separators=True,
+            escape_quotes=False
+            )
+        )
+    return command
+
+
+def uses_native_ogg_finalizer(filename):
+    # Plain ogg passthrough needs no ffmpeg unless the user asked for extra ffmpeg arguments
+    return Path(filename).suffix == '.ogg' and bool(config.get('native_ogg_finalize')) \
+        and len(config.get('ffmpeg_args')) == 0
 
 
 def convert_audio_format(filename, quality):
+    if uses_native_ogg_finalizer(filename) and os.path.isfile(os.path.abspath(filename)):
+        try:
+            finalize_ogg(filename)
+            return
+        except ValueError as exc:
+            logger.warning(f'Native ogg finalizing failed, falling back to ffmpeg: {exc}')
     if os.path.isfile(os.path.abspath(filename)):
         target_path = Path(filename)
-        bitrate = "320k" if quality == AudioQuality.VERY_HIGH else "160k"
         temp_name = os.path.join(
             target_path.parent, ".~"+target_path.stem+".ogg"
             )
         if os.path.isfile(temp_name):
             os.remove(temp_name)
         os.rename(filename, temp_name)
-        # Prepare default parameters
-        command = [
-            config.get('_ffmpeg_bin_path'),
-            '-i', sanitize_data(
-                temp_name,
-                allow_path_separators=True,
-                escape_quotes=False
-                )
-        ]
-        # If the media format is set to ogg, just correct the downloaded file
-        # and add tags
-        if target_path.suffix == '.ogg':
-            command = command + ['-c', 'copy']
-        else:
-            command = command + ['-ar', '44100', '-ac', '2', '-b:a', bitrate]
-        if int(os.environ.get('SHOW_FFMPEG_OUTPUT', 0)) == 0:
-            command = command + \
-                ['-loglevel', 'error', '-hide_banner', '-nostats']
-        # Add user defined parameters
-        for param in config.get('ffmpeg_args'):
-            command.append(param)
-        # Add output parameter at last
-        command.append(
+        command = build_ffmpeg_command(
             sanitize_data(
-                filename,
+                temp_name,
                 allow_path_separators=True,
                 escape_quotes=False
-                )
+                ),
+            filename,
+            quality
             )
         logger.info(
             f'Converting media with ffmpeg. Built commandline {command}'
@@ -220,6 +260,38 @@ def convert_audio_format(filename, quality):
         raise FileNotFoundError
 
 
+def open_transcode_pipe(filename, quality, buffer_size=-1):
+    # Start ffmpeg reading the raw stream from stdin, chunks are written to
+    # proc.stdin as they arrive so the raw ogg never touches the disk
+    if os.path.isfile(filename):
+        os.remove(filename)
+    command = build_ffmpeg_command('pipe:0', filename, quality)
+    logger.info(
+        f'Starting streaming conversion with ffmpeg. Built commandline {command}'
+        )
+    return subprocess.Popen(command, stdin=subprocess.PIPE, bufsize=buffer_size, shell=False)
+
+
+def finish_transcode_pipe(proc):
+    try:
+        proc.stdin.close()
+    except BrokenPipeError:
+        pass
+    proc.wait()
+    if proc.returncode != 0:
+        raise subprocess.CalledProcessError(proc.returncode, proc.args)
+
+
+def abort_transcode_pipe(proc):
+    if proc.poll() is None:
+        proc.kill()
+    try:
+        proc.stdin.close()
+    except BrokenPipeError:
+        pass
+    proc.wait()
+
+
 def conv_artist_format(artists):
     formatted = ""
     for artist in artists:
@@ -227,54 +299,122 @@ def conv_artist_format(artists):
     return formatted[:-2].strip()
 
 
+# Collects tags, artwork and lyrics and writes them with one music_tag save
+class TagWriter:
+    def __init__(self, filename):
+        self.filename = filename
+        self.__fields = {}
+
+    def set_metadata(self, metadata, track_id_str):
+        type_ = 'track'
+        for key in metadata.keys():
+            value = metadata[key]
+            if key == 'artists':
+                self.__fields['artist'] = conv_artist_format(value)
+            elif key in ['name', 'track_title', 'tracktitle']:
+                self.__fields['tracktitle'] = value
+            elif key in ['album_name', 'album']:
+                self.__fields['album'] = value
+            elif key in ['year', 'release_year']:
+                self.__fields['year'] = value
+            elif key in ['discnumber', 'disc_number', 'disknumber', 'disk_number']:
+                self.__fields['discnumber'] = value
+            elif key in ['track_number', 'tracknumber']:
+                self.__fields['tracknumber'] = value
+            elif key == 'lyrics':
+                self.__fields['lyrics'] = value
+            elif key == 'genre':
+                if 'Podcast' in value or 'podcast' in value:
+                    type_ = 'episode'
+                self.__fields['genre'] = conv_artist_format(value)
+            elif key in ['total_tracks', 'totaltracks']:
+                self.__fields['totaltracks'] = value
+            elif key in ['total_discs', 'totaldiscs', 'total_disks', 'totaldisks']:
+                self.__fields['totaldiscs'] = value
+            elif key == 'isrc':
+                self.__fields['isrc'] = value
+        self.__fields['comment'] = f'id[spotify.com:{type_}:{track_id_str}]'
+        return self
+
+    def set_artwork(self, image_url):
+        # A cover that can not be fetched is left out, the rest of the tags are still written
+        try:
+            self.__fields['artwork'] = artwork_cache.get(image_url, artwork_variant())
+        except Exception:
+            logger.error(f"Could not get artwork '{image_url}' for '{self.filename}', "
+                         f"tagging without it: {traceback.format_exc()}")
+        return self
+
+    def commit(self):
+        if len(self.__fields) == 0:
+            return
+        logger.info(f"Writing tags {list(self.__fields.keys())} for audio media at '{self.filename}'")
+        tags = music_tag.load_file(self.filename)
+        for key, value in self.__fields.items():
+            tags[key] = value
+        tags.save()
+        self.__fields.clear()
+
+
 def set_audio_tags(filename, metadata, track_id_str):
     logger.info(
         f"Setting tags for audio media at "
         "'{filename}', mediainfo -> '{metadata}'"
         )
-    type_ = 'track'
-    tags = music_tag.load_file(filename)
-    for key in metadata.keys():
-        value = metadata[key]
-        if key == 'artists':
-            tags['artist'] = conv_artist_format(value)
-        elif key in ['name', 'track_title', 'tracktitle']:
-            tags['tracktitle'] = value
-        elif key in ['album_name', 'album']:
-            tags['album'] = value
-        elif key in ['year', 'release_year']:
-            tags['year'] = value
-        elif key in ['discnumber', 'disc_number', 'disknumber', 'disk_number']:
-            tags['discnumber'] = value
-        elif key in ['track_number', 'tracknumber']:
-            tags['tracknumber'] = value
-        elif key == 'lyrics':
-            tags['lyrics'] = value
-        elif key == 'genre':
-            if 'Podcast' in value or 'podcast' in value:
-                type_ = 'episode'
-            tags['genre'] = conv_artist_format(value)
-        elif key in ['total_tracks', 'totaltracks']:
-            tags['totaltracks'] = value
-        elif key in ['total_discs', 'totaldiscs', 'total_disks', 'totaldisks']:
-            tags['totaldiscs'] = value
-        elif key == 'isrc':
-            tags['isrc'] = value
-    tags['comment'] = f'id[spotify.com:{type_}:{track_id_str}]'
-    tags.save()
+    TagWriter(filename).set_metadata(metadata, track_id_str).commit()
+
+
+# jpeg and png signatures
+ARTWORK_MAGIC = (b'\xff\xd8\xff', b'\x89PNG\r\n\x1a\n')
+
+
+def artwork_variant():
+    # Cached artwork is kept apart per processing setting, changing them never embeds stale covers
+    if config.get('artwork_mode') == 'original':
+        return 'original'
+    return f"{config.get('artwork_format')}-{config.get('artwork_max_size')}-{config.get('artwork_quality')}"
+
+
+def artwork_preferred_size():
+    # Pick the smallest source image that still covers the resize target instead of always the largest one
+    max_size = config.get('artwork_max_size')
+    if config.get('artwork_mode') != 'original' and max_size > 0:
+        return max_size * max_size
+    return 640000
+
+
+def encode_artwork(image_url, variant):
+    # Raising keeps error pages out of the artwork cache, only returned bytes are stored
+    response = http_get(image_url)
+    response.raise_for_status()
+    data = response.content
+    if not data.startswith(ARTWORK_MAGIC):
+        raise ValueError(f'Artwork "{image_url}" is not a jpeg or png image')
+    if variant == 'original':
+        # Spotify serves jpeg covers, embedding them untouched skips a decode and keeps files small
+        return data
+    img = Image.open(BytesIO(data))
+    max_size = config.get('artwork_max_size')
+    if max_size > 0 and max(img.size) > max_size:
+        img.thumbnail((max_size, max_size), Image.LANCZOS)
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+    buf = BytesIO()
+    if config.get('artwork_format') == 'png':
+        img.save(buf, format='png', optimize=True)
+    else:
+        img.save(buf, format='jpeg', quality=config.get('artwork_quality'), optimize=True)
+    return buf.getvalue()
+
+
+artwork_cache = ArtworkCache(os.path.join(config.get('_cache_dir'), 'artwork'), encode_artwork,
+                             max_memory_bytes=config.get('artwork_cache_memory_mb') * 1024 * 1024,
+                             max_age_days=config.get('artwork_cache_days'))
 
 
 def set_music_thumbnail(filename, image_url):
     logger.info(f"Set thumbnail for audio media at '{filename}' with '{image_url}'")
-    img = Image.open(BytesIO(requests.get(image_url).content))
-    buf = BytesIO()
-    if img.mode != 'RGB':
-        img = img.convert('RGB')
-    img.save(buf, format='png')
-    buf.seek(0)
-    tags = music_tag.load_file(filename)
-    tags['artwork'] = buf.read()
-    tags.save()
+    TagWriter(filename).set_artwork(image_url).commit()
 
 
 def search_by_term(session,
@@ -296,18 +436,18 @@ def search_by_term(session,
     if content_types is None:
         content_types = ["track", "album", "playlist", "artist"]
     token = session.tokens().get("user-read-email")
-    resp = requests.get(
+    resp = make_call(
         "https://api.spotify.com/v1/search",
-        {
+        token=token,
+        params={
             "limit": max_results,
             "offset": "0",
             "q": search_term,
             "type": ",".join(c_type for c_type in content_types)
-        },
-        headers={"Authorization": "Bearer %s" % token},
+        }
     )
     for c_type in content_types:
-        results[c_type + "s"] = resp.json()[c_type + "s"]["items"]
+        results[c_type + "s"] = resp[c_type + "s"]["items"]
     if len(results["tracks"]) + len(results["albums"]) + len(results["artists"]) + len(results["playlists"]) == 0:
         logger.warning(f"No results for term '{search_term}', max items '{max_results}'")
         raise EmptySearchResultException("No result found for search term '{}' ".format(search_term))
@@ -322,10 +462,11 @@ def check_premium(session):
 
 
 def get_song_info(session, song_id):
-    token = session.tokens().get("user-read-email")
-    uri = f'https://api.spotify.com/v1/tracks?ids={song_id}&market=from_token'
+    return get_songs_info(session, [song_id])[song_id]
+
+
+def get_track_credits(token, song_id):
     uri_credits = f'https://spclient.wg.spotify.com/track-credits-view/v0/experimental/{song_id}/credits'
-    info = make_call(uri, token=token)
     credits_json = make_call(uri_credits, token=token)
     credits = {}
     try:
@@ -340,42 +481,66 @@ def get_song_info(session, song_id):
         logger.warn(f"roleCredits not found in credits response:\n{credits_json}")
         pass
     credits['source'] = credits_json.get('sourceNames', [])
-    album_url = info['tracks'][0]['album']['href']
-    artist_url = info['tracks'][0]['artists'][0]['href']
-    album_data = make_call(album_url, token=token)
-    artist_data = make_call(artist_url, token=token)
-    artists = []
-    for data in info['tracks'][0]['artists']:
-        artists.append(sanitize_data(data['name']))
-    info = {
-        'artists': artists,
-        'album_name': sanitize_data(info['tracks'][0]['album']["name"]),
-        'name': sanitize_data(info['tracks'][0]['name']),
-        'image_url': get_thumbnail(info['tracks'][0]['album']['images'], preferred_size=640000),
-        'release_year': info['tracks'][0]['album']['release_date'].split("-")[0],
-        'disc_number': info['tracks'][0]['disc_number'],
-        'track_number': info['tracks'][0]['track_number'],
-        'total_tracks': info['tracks'][0]['album']['total_tracks'],
-        'total_discs': sorted([trk['disc_number'] for trk in album_data['tracks']['items']])[-1] if 'tracks' in album_data else 1,
-        'scraped_song_id': info['tracks'][0]['id'],
-        'is_playable': info['tracks'][0]['is_playable'],
-        'popularity': info['tracks'][0]['popularity'],
-        'isrc': info['tracks'][0]['external_ids'].get('isrc', ''),
-        'genre': artist_data['genres'],
-        'duration': info['tracks'][0]['duration_ms'],
-        'credits': credits,
-        # https://developer.spotify.com/documentation/web-api/reference/get-track
-        # List of genre is supposed to be here, genre from album API is deprecated and it always seems to be unavailable
-        # Use artist endpoint to get artist's genre instead
-        'label': sanitize_data(album_data['label']),
-        'copyrights':  [
-            sanitize_data(holder['text'])
-            for holder
-            in album_data['copyrights']
-            ],
-        'explicit': info['tracks'][0]['explicit']
-    }
-    return info
+    return credits
+
+
+def get_songs_info(session, song_ids):
+    # Tracks, albums and artists of all songs are resolved together in as few requests as possible. Songs that can
+    # not be resolved are left out of the result instead of failing the others.
+    token = session.tokens().get("user-read-email")
+    tracks = get_entities(token, 'tracks', song_ids)
+    found = [song_id for song_id in song_ids if tracks.get(song_id) is not None]
+    if len(found) != len(song_ids):
+        logger.error(f'Tracks not found: {[song_id for song_id in song_ids if song_id not in found]}')
+    albums = get_entities(token, 'albums', [tracks[song_id]['album']['id'] for song_id in found])
+    artists = get_entities(token, 'artists', [tracks[song_id]['artists'][0]['id'] for song_id in found])
+    # Credits have no multi-id endpoint, their requests run side by side
+    with ThreadPoolExecutor(max_workers=max(1, min(8, len(found)))) as pool:
+        all_credits = dict(zip(found, pool.map(lambda song_id: get_track_credits(token, song_id), found)))
+    songs_info = {}
+    for song_id in found:
+        track = tracks[song_id]
+        credits = all_credits[song_id]
+        album_data = albums.get(track['album']['id'])
+        artist_data = artists.get(track['artists'][0]['id'])
+        if album_data is None or artist_data is None:
+            logger.error(f"Album or artist of track '{song_id}' not found, skipping it")
+            continue
+        try:
+            artists_names = []
+            for data in track['artists']:
+                artists_names.append(sanitize_data(data['name']))
+            songs_info[song_id] = {
+                'artists': artists_names,
+                'album_name': sanitize_data(track['album']["name"]),
+                'name': sanitize_data(track['name']),
+                'image_url': get_thumbnail(track['album']['images'], preferred_size=artwork_preferred_size()),
+                'release_year': track['album']['release_date'].split("-")[0],
+                'disc_number': track['disc_number'],
+                'track_number': track['track_number'],
+                'total_tracks': track['album']['total_tracks'],
+                'total_discs': sorted([trk['disc_number'] for trk in album_data['tracks']['items']])[-1] if 'tracks' in album_data else 1,
+                'scraped_song_id': track['id'],
+                'is_playable': track['is_playable'],
+                'popularity': track['popularity'],
+                'isrc': track['external_ids'].get('isrc', ''),
+                'genre': artist_data['genres'],
+                'duration': track['duration_ms'],
+                'credits': credits,
+                # https://developer.spotify.com/documentation/web-api/reference/get-track
+                # List of genre is supposed to be here, genre from album API is deprecated and it always seems to be unavailable
+                # Use artist endpoint to get artist's genre instead
+                'label': sanitize_data(album_data['label']),
+                'copyrights':  [
+                    sanitize_data(holder['text'])
+                    for holder
+                    in album_data['copyrights']
+                    ],
+                'explicit': track['explicit']
+            }
+        except (KeyError, TypeError, IndexError):
+            logger.error(f"Incomplete metadata for track '{song_id}', skipping it: {traceback.format_exc()}")
+    return songs_info
 
 
 def get_episode_info(session, episode_id_str):
@@ -389,24 +554,20 @@ def get_episode_info(session, episode_id_str):
 
 
 def get_show_episodes(session, show_id_str):
+    # Yields episode ids page by page
     logger.info(f"Get episodes for show by id '{show_id_str}'")
     access_token = session.tokens().get("user-read-email")
-    episodes = []
     offset = 0
     limit = 50
     while True:
-        headers = {'Authorization': f'Bearer {access_token}'}
         params = {'limit': limit, 'offset': offset}
         resp = make_call(f'https://api.spotify.com/v1/shows/{show_id_str}/episodes', token=access_token, params=params)
         offset += limit
-        for episode in resp["items"]:
-            episodes.append(episode["id"])
+        yield [episode["id"] for episode in resp["items"]]
 
         if len(resp['items']) < limit:
             break
 
-    return episodes
-
 
 def get_thumbnail(image_dict, preferred_size=22500):
     images = {}
@@ -422,25 +583,153 @@ def get_thumbnail(image_dict, preferred_size=22500):
             return images[size]
     return images[available_sizes[-1]] if len(available_sizes) > 0 else ""
 
+def request_cache_key(url, params=None):
+    if params is None:
+        params = {}
+    return md5(f'{url}-{";".join( str(key)+":"+str(value) for key, value in params.items() )}'.encode()).hexdigest()
+
+
+def request_ttl(url):
+    # Catalog entities barely change, playlists and search results do, listings like artist albums grow over time
+    path = url.split('?', 1)[0]
+    if path.startswith('https://api.spotify.com/v1/search'):
+        return config.get('cache_ttl_search')
+    if path.startswith('https://api.spotify.com/v1/playlists/'):
+        return config.get('cache_ttl_playlist')
+    if re.match(r'https://api\.spotify\.com/v1/(tracks|albums|artists|episodes|shows)/[^/]+(/tracks)?$', path) \
+            or path.startswith('https://spclient.wg.spotify.com/track-credits-view/'):
+        return config.get('cache_ttl_catalog')
+    return config.get('cache_ttl_default')
+
+
+# Fields the app reads from each kind of cached response, everything else is dropped from compact records
+TRACK_LISTING_FIELDS = {'id': None, 'name': None, 'explicit': None, 'artists': {'id': None, 'name': None}}
+RECORD_PROJECTIONS = [
+    (r'https://api\.spotify\.com/v1/tracks/[^/]+$', {
+        'id': None, 'name': None, 'disc_number': None, 'track_number': None, 'is_playable': None,
+        'popularity': None, 'explicit': None, 'duration_ms': None, 'external_ids': {'isrc': None},
+        'artists': {'id': None, 'name': None},
+        'album': {'id': None, 'name': None, 'images': None, 'release_date': None, 'total_tracks': None}
+    }),
+    (r'https://api\.spotify\.com/v1/albums/[^/]+$', {
+        'id': None, 'name': None, 'release_date': None, 'total_tracks': None, 'label': None, 'images': None,
+        'copyrights': {'text': None}, 'artists': {'id': None, 'name': None},
+        'tracks': {'items': {'disc_number': None}}
+    }),
+    (r'https://api\.spotify\.com/v1/artists/[^/]+$', {'id': None, 'name': None, 'genres': None}),
+    (r'https://api\.spotify\.com/v1/albums/[^/]+/tracks$', {'items': TRACK_LISTING_FIELDS}),
+    (r'https://api\.spotify\.com/v1/playlists/[^/]+/tracks$', {'items': {'track': TRACK_LISTING_FIELDS}, 'next': None}),
+    (r'https://spclient\.wg\.spotify\.com/track-credits-view/.+/credits$', {
+        'roleCredits': {'roleTitle': None, 'artists': {'name': None}}, 'sourceNames': None
+    }),
+]
+
+
+def record_projection(url):
+    if not config.get('compact_request_cache'):
+        return None
+    path = url.split('?', 1)[0]
+    for pattern, spec in RECORD_PROJECTIONS:
+        if re.match(pattern, path):
+            return spec
+    return None
+
+
+def read_request_cache(url, params=None):
+    request_key = request_cache_key(url, params)
+    cached = request_store.get(request_key, max_age=request_ttl(url))
+    if cached is not None:
+        logger.debug(f'URL "{url}" cache found ! HASH: {request_key}')
+        try:
+            return decode_record(cached) if is_record(cached) else json.loads(cached)
+        except ValueError:
+            logger.error(f'URL "{url}" cache has invalid data, retring request !')
+            request_store.delete(request_key)
+    logger.debug(f'URL "{url}" has cache miss ! HASH: {request_key}; Fetching data')
+    return None
+
+
+def write_request_cache(url, params, data, text=None):
+    # Responses with a known projection are stored as compact records, anything else as json text
+    if request_ttl(url) <= 0:
+        return
+    spec = record_projection(url)
+    if spec is not None:
+        body = encode_record(project(data, spec))
+    else:
+        body = text if text is not None else json.dumps(data)
+    request_store.put(request_cache_key(url, params), url, body)
+
+
 def make_call(url, token, params=None, no_cache=False):
     if params is None:
         params = {}
     if not no_cache:
-        request_key = md5(f'{url}-{";".join( str(key)+":"+str(value) for key, value in params.items() )}'.encode()).hexdigest()
-        req_cache_file = os.path.join(config.get('_cache_dir'), 'reqcache', request_key+'.otcache')
-        os.makedirs(os.path.dirname(req_cache_file), exist_ok=True)
-        if os.path.isfile(req_cache_file):
-            logger.debug(f'URL "{url}" cache found ! HASH: {request_key}')
-            try:
-                with open(req_cache_file, 'r', encoding='utf-8') as cf:
-                    json_data = json.load(cf)
-                return json_data
-            except json.JSONDecodeError:
-                logger.error(f'URL "{url}" cache has invalid data, retring request !')
-                pass
-        logger.debug(f'URL "{url}" has cache miss ! HASH: {request_key}; Fetching data')
-    response = requests.get(url, headers={"Authorization": "Bearer %s" % token}, params=params).text
-    if not no_cache:
-        with open(req_cache_file, 'w', encoding='utf-8') as cf:
-            cf.write(response)
-    return json.loads(response)
+        json_data = read_request_cache(url, params)
+        if json_data is not None:
+            return json_data
+    response = http_get(url, headers={"Authorization": "Bearer %s" % token}, params=params)
+    json_data = json.loads(response.text)
+    # Error responses are never cached, with a ttl they would outlive the cause
+    if not no_cache and response.ok:
+        write_request_cache(url, params, json_data, text=response.text)
+        spec = record_projection(url)
+        if spec is not None:
+            # Callers see the same fields on a miss as on a later hit
+            json_data = project(json_data, spec)
+    return json_data
+
+
+def entity_url(kind, entity_id):
+    if kind == 'tracks':
+        return f'https://api.spotify.com/v1/tracks/{entity_id}?market=from_token'
+    return f'https://api.spotify.com/v1/{kind}/{entity_id}'
+
+
+def fetch_entities(kind, token, ids):
+    # One multi-id web api request, every entity is also cached under its single item url
+    url = f'https://api.spotify.com/v1/{kind}?ids={",".join(ids)}'
+    if kind == 'tracks':
+        url += '&market=from_token'
+    resp = make_call(url, token=token, no_cache=True)
+    if 'error' in resp:
+        # An error body has no entities, returning none would mark every id of the batch missing
+        logger.error(f'Fetching {kind} {ids} failed: {resp["error"]}')
+        raise WebApiException(f'Web api error for {kind}: {resp["error"]}')
+    entities = {}
+    # Items come back in request order, relinked tracks carry a different id than the requested one
+    for entity_id, entity in zip(ids, resp.get(kind, [])):
+        if entity is None:
+            continue
+        url = entity_url(kind, entity_id)
+        write_request_cache(url, None, entity)
+        spec = record_projection(url)
+        entities[entity_id] = project(entity, spec) if spec is not None else entity
+    return entities
+
+
+entity_resolvers = {
+    kind: BatchResolver(kind, lambda token, ids, kind=kind: fetch_entities(kind, token, ids), limit,
+                        window=config.get('api_batch_window'))
+    for kind, limit in [('tracks', 50), ('albums', 20), ('artists', 50)]
+}
+
+
+def get_entities(token, kind, ids):
+    # Memory cache first, then the request cache on disk, then batched web api requests
+    entities = {}
+    missing = []
+    for entity_id in ids:
+        if entity_id in entities:
+            continue
+        cached = entity_cache.get((kind, entity_id))
+        if cached is None:
+            cached = entity_cache.put((kind, entity_id), read_request_cache(entity_url(kind, entity_id)))
+        if cached is not None:
+            entities[entity_id] = cached
+        elif entity_id not in missing:
+            missing.append(entity_id)
+    if missing:
+        for entity_id, entity in entity_resolvers[kind].get_many(token, missing).items():
+            entities[entity_id] = entity_cache.put((kind, entity_id), entity)
+    return entities
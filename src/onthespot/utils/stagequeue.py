@@ -0,0 +1,55 @@
+import itertools
+import threading
+import time
+from queue import PriorityQueue
+
+# Item priorities, lower runs first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_NORMAL = 1
+PRIORITY_BULK = 2
+
+
+# Post processing queue ordered by job priority then submission, logs stats every 'stats_every' jobs
+class StageQueue(PriorityQueue):
+    def __init__(self, maxsize=0, name='', logger=None, stats_every=25):
+        super(StageQueue, self).__init__(maxsize)
+        self.name = name
+        self.__logger = logger
+        self.__stats_every = stats_every
+        self.__counter = itertools.count()
+        self.__stats_lock = threading.Lock()
+        self.submitted = 0
+        self.taken = 0
+        self.max_depth = 0
+        self.total_wait = 0.0
+
+    def put(self, job, block=True, timeout=None):
+        super(StageQueue, self).put(
+            (job.get('priority', PRIORITY_NORMAL), next(self.__counter), time.monotonic(), job), block, timeout
+        )
+
+    def get(self, block=True, timeout=None):
+        _, _, queued_at, job = super(StageQueue, self).get(block, timeout)
+        with self.__stats_lock:
+            self.taken += 1
+            self.total_wait += time.monotonic() - queued_at
+            report = self.__logger is not None and self.__stats_every > 0 and self.taken % self.__stats_every == 0
+        if report:
+            self.__logger.info(f"Stage queue '{self.name}' stats: {self.stats()}")
+        return job
+
+    def _put(self, item):
+        # Runs under the queue mutex
+        super(StageQueue, self)._put(item)
+        self.submitted += 1
+        self.max_depth = max(self.max_depth, len(self.queue))
+
+    def stats(self):
+        with self.__stats_lock:
+            return {
+                'depth': self.qsize(),
+                'max_depth': self.max_depth,
+                'submitted': self.submitted,
+                'taken': self.taken,
+                'avg_wait': round(self.total_wait / self.taken, 2) if self.taken else 0.0
+            }
@@ -1,11 +1,13 @@
 import os
+import json
 import platform
+import threading
 import time
-import requests
 from librespot.core import Session
 import re
 from ..runtimedata import get_logger
 from .spotify import search_by_term
+from .http_client import http_get
 import subprocess
 import asyncio
 import traceback
@@ -15,10 +17,55 @@ if platform.system() == "Windows":
 
 logger = get_logger("utils")
 media_tracker_last_query = ''
+_session_locks = {}
+_session_locks_lock = threading.Lock()
+
+
+def read_part_info(part_path: str) -> dict:
+    # Returns the sidecar of a partial download if the sidecar and the .part file are both usable
+    info_path = part_path + '.json'
+    if not os.path.isfile(part_path) or not os.path.isfile(info_path):
+        return {}
+    try:
+        with open(info_path, 'r', encoding='utf-8') as f:
+            info = json.load(f)
+        info['offset'] = min(int(info.get('offset', 0)), os.path.getsize(part_path))
+        return info
+    except (OSError, ValueError, TypeError):
+        logger.warning(f'Unreadable partial download info at "{info_path}", ignoring it')
+        return {}
+
+
+def write_part_info(part_path: str, info: dict) -> None:
+    info_path = part_path + '.json'
+    with open(info_path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(info, f)
+    os.replace(info_path + '.tmp', info_path)
+
+
+def remove_part_files(part_path: str) -> None:
+    for path in [part_path, part_path + '.json', part_path + '.json.tmp']:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def session_lock(session_uuid: str) -> threading.Lock:
+    with _session_locks_lock:
+        return _session_locks.setdefault(session_uuid, threading.Lock())
 
 
 def re_init_session(session_pool: dict, session_uuid: str, wait_connectivity: bool = False,
-                    connectivity_test_url: str = 'https://spotify.com', timeout=60) -> bool:
+                    connectivity_test_url: str = 'https://spotify.com', timeout=60, failed_session=None) -> bool:
+    # Download and parsing workers share sessions, only one of them rebuilds a session at a time. A caller passing
+    # the session it failed with reuses the pool entry if another worker replaced it in the meantime.
+    with session_lock(session_uuid):
+        if failed_session is not None and session_pool.get(session_uuid) not in (None, failed_session):
+            logger.info(f'Session {session_uuid} was already re initialised by another worker')
+            return True
+        return _re_init_session(session_pool, session_uuid, wait_connectivity, connectivity_test_url, timeout)
+
+
+def _re_init_session(session_pool, session_uuid, wait_connectivity, connectivity_test_url, timeout):
     start = int(time.time())
     session_json_path = os.path.join(os.path.join(os.path.expanduser('~'), '.cache', 'casualOnTheSpot', 'sessions'),
                                      f"ots_login_{session_uuid}.json")
@@ -28,7 +75,7 @@ def re_init_session(session_pool: dict, session_uuid: str, wait_connectivity: bo
         status = 0
         while status != 200 and int(time.time()) - start < timeout:
             try:
-                r = requests.get(connectivity_test_url)
+                r = http_get(connectivity_test_url)
                 status = r.status_code
                 logger.info(f'Connectivity check done ! Status code "{status}" ')
             except:
@@ -40,10 +87,16 @@ def re_init_session(session_pool: dict, session_uuid: str, wait_connectivity: bo
         logger.debug("Session config created")
         session = Session.Builder(conf=config).stored_file(session_json_path).create()
         logger.debug("Session re init done")
+        old_session = session_pool.get(session_uuid)
         session_pool[session_uuid] = session
     except:
         logger.error('Failed to re init session !')
         return False
+    if old_session is not None:
+        try:
+            old_session.close()
+        except Exception:
+            logger.debug(f'Closing replaced session {session_uuid} failed: {traceback.format_exc()}')
     return True
 
 
@@ -89,15 +142,18 @@ def login_user(username: str, password: str, login_data_dir: str, uuid: str) ->
 def remove_user(username: str, login_data_dir: str, config, session_uuid: str, thread_pool: dict,
                 session_pool: dict) -> bool:
     logger.info(f"Removing user '{username[:4]}****@****.***' from saved entries, uuid {session_uuid}")
-    # Try to stop the thread using this account
+    # Try to stop the threads using this account
     if session_uuid in thread_pool.keys():
-        thread_pool[session_uuid][0].stop()
-        logger.info(f'Waiting for worker bound to account : {session_uuid} to exit !')
-        while not thread_pool[session_uuid][0].is_stopped():
-            time.sleep(0.1)
-        logger.info(f'Waiting for thread bound to worker bound account : {session_uuid} to exit !')
-        while thread_pool[session_uuid][1].isRunning():
-            thread_pool[session_uuid][1].quit()
+        for worker, thread in thread_pool[session_uuid]:
+            worker.stop()
+        logger.info(f'Waiting for workers bound to account : {session_uuid} to exit !')
+        for worker, thread in thread_pool[session_uuid]:
+            while not worker.is_stopped():
+                time.sleep(0.1)
+        logger.info(f'Waiting for threads bound to worker bound account : {session_uuid} to exit !')
+        for worker, thread in thread_pool[session_uuid]:
+            while thread.isRunning():
+                thread.quit()
         logger.info(f'Workers and threads associated with account : {session_uuid} cleaned up !')
         thread_pool.pop(session_uuid)
     # Remove from session pool
@@ -1,4 +1,8 @@
 from .media import MediaWatcher
 from .downloader import DownloadWorker
+from .postprocess import PostProcessWorker
+from .progress import ProgressAggregator
+from .prefetch import MetadataPrefetcher
+from .library import LibraryScanner
 from .session import LoadSessions
 from .utility import PlayListMaker, ParsingQueueProcessor
\ No newline at end of file
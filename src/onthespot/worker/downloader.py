@@ -12,10 +12,40 @@ from librespot.metadata import TrackId, EpisodeId
 from urllib3.exceptions import MaxRetryError, NewConnectionError
 
 from ..otsconfig import config
-from ..runtimedata import get_logger, cancel_list, failed_downloads, unavailable, session_pool
-from ..utils.spotify import check_premium, get_song_info, convert_audio_format, set_music_thumbnail, set_audio_tags, \
-    get_episode_info, get_track_lyrics
-from ..utils.utils import re_init_session
+from ..runtimedata import get_logger, cancel_list, failed_downloads, unavailable, session_pool, convert_queue, \
+    tagging_queue, prefetched_metadata
+from ..utils.spotify import check_premium, get_song_info, get_episode_info, open_transcode_pipe, \
+    finish_transcode_pipe, abort_transcode_pipe, uses_native_ogg_finalizer
+from ..utils.library import library_index, find_downloaded
+from ..utils.stagequeue import PRIORITY_NORMAL
+from ..utils.utils import re_init_session, read_part_info, write_part_info, remove_part_files
+
+
+# Sizes stream reads from measured throughput, never across a librespot chunk boundary
+class AdaptiveChunkSize:
+    STREAM_CHUNK = 128 * 1024
+
+    def __init__(self, initial, minimum, target_latency):
+        self.size = max(minimum, min(initial, self.STREAM_CHUNK))
+        self.__min = minimum
+        self.__target = target_latency
+        self.__rate = None
+        self.__started = 0.0
+
+    def next(self, position, remaining):
+        self.__started = time.perf_counter()
+        return min(self.size, remaining, self.STREAM_CHUNK - position % self.STREAM_CHUNK)
+
+    def update(self, read_bytes):
+        elapsed = time.perf_counter() - self.__started
+        if read_bytes <= 0:
+            return
+        if elapsed <= 0:
+            self.size = min(self.size * 2, self.STREAM_CHUNK)
+            return
+        rate = read_bytes / elapsed
+        self.__rate = rate if self.__rate is None else 0.7 * self.__rate + 0.3 * rate
+        self.size = int(max(self.__min, min(self.STREAM_CHUNK, self.__rate * self.__target)))
 
 
 class DownloadWorker(QObject):
@@ -26,10 +56,106 @@ class DownloadWorker(QObject):
     logger = None
     __session_uuid = None
     __queue = None
+    __current_item = None
+    __output = None
+    __transcode_proc = None
+    __part = None
     __stop = False
     __last_cancelled = False
     __stopped = False
 
+    def __open_output(self, filename, quality, stream, transcode=False):
+        # Opens the download target and returns the byte offset the download continues from.
+        # A large write buffer is allocated once per file and reused for every chunk
+        buffer_size = config.get('write_buffer_size')
+        self.__part = None
+        if transcode:
+            self.__transcode_proc = open_transcode_pipe(filename, quality, buffer_size=buffer_size)
+            self.__output = self.__transcode_proc.stdin
+            return 0
+        part_path = filename + '.part'
+        self.__part = {
+            'path': part_path,
+            'file_id': stream.metrics.file_id,
+            'total_size': stream.input_stream.size
+        }
+        info = read_part_info(part_path)
+        offset = 0
+        if config.get('resume_partial_downloads') and self.__part['file_id'] is not None \
+                and info.get('file_id') == self.__part['file_id'] \
+                and info.get('total_size') == self.__part['total_size']:
+            offset = info['offset']
+        if offset > 0:
+            self.logger.info(f"Resuming partial download '{part_path}' from byte {offset}")
+            self.__output = open(part_path, 'r+b', buffering=buffer_size)
+            self.__output.truncate(offset)
+            self.__output.seek(offset)
+            input_stream = stream.input_stream.stream()
+            input_stream.seek(input_stream.pos() + offset)
+        else:
+            remove_part_files(part_path)
+            self.__output = open(part_path, 'wb', buffering=buffer_size)
+        return offset
+
+    def __sync_partial(self):
+        if self.__part is None or self.__output is None:
+            return
+        self.__output.flush()
+        write_part_info(self.__part['path'], {
+            'file_id': self.__part['file_id'],
+            'total_size': self.__part['total_size'],
+            'offset': self.__output.tell()
+        })
+
+    def __chunk_sizer(self):
+        if not config.get('adaptive_chunk_size'):
+            return None
+        return AdaptiveChunkSize(config.get('chunk_size'), config.get('min_chunk_size'),
+                                 config.get('chunk_target_latency'))
+
+    def __write_output(self, data):
+        try:
+            self.__output.write(data)
+        except BrokenPipeError:
+            # ffmpeg exited before the stream ended, report it like a failed conversion
+            self.__transcode_proc.wait()
+            raise subprocess.CalledProcessError(self.__transcode_proc.returncode, self.__transcode_proc.args)
+
+    def __finish_output(self, filename):
+        if self.__transcode_proc is not None:
+            proc = self.__transcode_proc
+            self.__transcode_proc = self.__output = None
+            finish_transcode_pipe(proc)
+        elif self.__output is not None:
+            self.__output.close()
+            self.__output = None
+            os.replace(self.__part['path'], filename)
+            remove_part_files(self.__part['path'])
+            self.__part = None
+
+    def __keep_partial(self, filename):
+        # Recoverable failure, leave the .part file and its sidecar for the next attempt to resume
+        if self.__transcode_proc is not None or not config.get('resume_partial_downloads'):
+            self.__discard_output(filename)
+            return
+        if self.__output is not None:
+            self.__sync_partial()
+            self.__output.close()
+            self.logger.info(f"Keeping partial download '{self.__part['path']}' for resuming")
+        self.__output = self.__part = None
+
+    def __discard_output(self, filename):
+        # ffmpeg or the file handle must be gone before the file can be removed on every platform
+        if self.__transcode_proc is not None:
+            abort_transcode_pipe(self.__transcode_proc)
+            if os.path.exists(filename):
+                os.remove(filename)
+        elif self.__output is not None:
+            self.__output.close()
+        if self.__part is not None:
+            remove_part_files(self.__part['path'])
+        self.__transcode_proc = self.__output = self.__part = None
+
     def download_track(self, session, track_id_str, extra_paths="", force_album_format=False, extra_path_as_root=False,
                        force_album_after_extra_path_as_root=False, playlist_name='', playlist_owner='', playlist_desc=''):
         trk_track_id_str = track_id_str
@@ -44,12 +170,21 @@ class DownloadWorker(QObject):
             self.__last_cancelled = True
             return False
         skip_existing_file = True
+        # Settings are read once per job, not on every chunk
         chunk_size = config.get("chunk_size")
+        end_padding = config.get("dl_end_padding_bytes")
+        max_retries = config.get("max_retries")
+        part_sync_bytes = config.get("part_sync_bytes")
         quality = AudioQuality.HIGH
         if check_premium(session) or config.get('force_premium'):
             quality = AudioQuality.VERY_HIGH
         try:
-            song_info = get_song_info(session, track_id_str)
+            prefetched = prefetched_metadata.pop(track_id_str, None)
+            if prefetched is not None:
+                self.logger.debug(f"Using prefetched metadata for track by id '{track_id_str}'")
+                song_info = prefetched['info']
+            else:
+                song_info = get_song_info(session, track_id_str)
             _artist = song_info['artists'][0]
             album_root_formatter = os.path.join(config.get("album_name_formatter").format(
                     artist=_artist,
@@ -112,6 +247,11 @@ class DownloadWorker(QObject):
                                         filename,
                                         f'{song_info["name"]} [{_artist} - {song_info["album_name"]}:{song_info["release_year"]}].f{config.get("media_format")}'])
                     self.logger.info(f"File already exists, Skipping download for track by id '{trk_track_id_str}'")
+                    try:
+                        library_index.add(trk_track_id_str, 'track', filename,
+                                          f'{song_info["name"]} [{_artist} - {song_info["album_name"]}:{song_info["release_year"]}].f{config.get("media_format")}')
+                    except Exception:
+                        self.logger.error(f"Could not add '{trk_track_id_str}' to library index: {traceback.format_exc()}")
                     self.__last_cancelled = True
                     return True
                 else:
@@ -123,91 +263,88 @@ class DownloadWorker(QObject):
                         track_id, VorbisOnlyAudioQuality(quality), False, None)
                     os.makedirs(os.path.dirname(filename), exist_ok=True)
                     total_size = stream.input_stream.size
-                    downloaded = 0
+                    input_stream = stream.input_stream.stream()
                     _CHUNK_SIZE = chunk_size
+                    sizer = self.__chunk_sizer()
                     fail = 0
-                    with open(filename, 'wb') as file:
-                        while downloaded < total_size:
-                            if trk_track_id_str in cancel_list:
-                                self.progress.emit([trk_track_id_str, "Cancelled", [0, 100]])
-                                cancel_list.pop(trk_track_id_str)
-                                self.__last_cancelled = True
-                                if os.path.exists(filename):
-                                    file.close()
-                                    os.remove(filename)
-                                return False
-                            self.logger.debug(
-                                f"Reading chunk of {_CHUNK_SIZE} bytes from stream  track by id '{trk_track_id_str}'")
-                            data = stream.input_stream.stream().read(_CHUNK_SIZE)
-                            self.logger.debug(
-                                f"Got {len(data)} bytes of data for track by id '{trk_track_id_str}'")
-                            downloaded += len(data)
-                            if len(data) != 0:
-                                file.write(data)
-                                self.progress.emit([trk_track_id_str, None, [downloaded, total_size]])
-                            if len(data) == 0 and _CHUNK_SIZE > config.get("dl_end_padding_bytes"):
-                                self.logger.error(
-                                    f"PD Error for track by id '{trk_track_id_str}', "
-                                    f"while reading chunk size: {_CHUNK_SIZE}"
-                                )
-                                fail += 1
-                            elif len(data) == 0 and _CHUNK_SIZE <= config.get("dl_end_padding_bytes"):
-                                break
-                            if (total_size - downloaded) < _CHUNK_SIZE:
-                                _CHUNK_SIZE = total_size - downloaded
-                            if fail > config.get("max_retries"):
-                                self.progress.emit([trk_track_id_str, "RETRY " + str(fail + 1), None])
-                                self.logger.error(f"Max retries exceed for track by id '{trk_track_id_str}'")
-                                self.progress.emit([trk_track_id_str, "PD error. Will retry", None])
-                                if os.path.exists(filename):
-                                    os.remove(filename)
-                                return None
+                    streamed = bool(config.get('stream_transcode')) and not config.get("force_raw") \
+                        and not uses_native_ogg_finalizer(filename)
+                    downloaded = synced = self.__open_output(filename, quality, stream, transcode=streamed)
+                    chunks = 0
+                    while downloaded < total_size:
+                        if trk_track_id_str in cancel_list:
+                            self.progress.emit([trk_track_id_str, "Cancelled", [0, 100]])
+                            cancel_list.pop(trk_track_id_str)
+                            self.__last_cancelled = True
+                            self.__discard_output(filename)
+                            return False
+                        if sizer is not None:
+                            _CHUNK_SIZE = sizer.next(input_stream.pos(), total_size - downloaded)
+                        data = input_stream.read(_CHUNK_SIZE)
+                        if sizer is not None:
+                            sizer.update(len(data))
+                        chunks += 1
+                        downloaded += len(data)
+                        if len(data) != 0:
+                            self.__write_output(data)
                             self.progress.emit([trk_track_id_str, None, [downloaded, total_size]])
-                    if not config.get("force_raw"):
+                            if downloaded - synced >= part_sync_bytes:
+                                self.__sync_partial()
+                                synced = downloaded
+                        elif _CHUNK_SIZE > end_padding:
+                            self.logger.error(
+                                f"PD Error for track by id '{trk_track_id_str}', "
+                                f"while reading chunk size: {_CHUNK_SIZE}"
+                            )
+                            fail += 1
+                        else:
+                            break
+                        if (total_size - downloaded) < _CHUNK_SIZE:
+                            _CHUNK_SIZE = total_size - downloaded
+                        if fail > max_retries:
+                            self.progress.emit([trk_track_id_str, "RETRY " + str(fail + 1), None])
+                            self.logger.error(f"Max retries exceed for track by id '{trk_track_id_str}'")
+                            self.progress.emit([trk_track_id_str, "PD error. Will retry", None])
+                            self.__keep_partial(filename)
+                            return None
+                    if streamed:
                         self.progress.emit([trk_track_id_str, "Converting", None])
-                        convert_audio_format(filename, quality)
-                        self.progress.emit([trk_track_id_str, "Writing metadata", None])
-                        set_audio_tags(filename, song_info, trk_track_id_str)
-                        self.progress.emit([trk_track_id_str, "Setting thumbnail", None])
-                        set_music_thumbnail(filename, song_info['image_url'])
-                    else:
+                    self.__finish_output(filename)
+                    self.logger.info(f"Streamed track by id '{trk_track_id_str}', {downloaded} bytes in {chunks} chunks, "
+                                     f"handing over to post processing")
+                    job = {
+                        'media_type': 'track',
+                        'media_id': trk_track_id_str,
+                        'filename': filename,
+                        'media_name': f'{song_info["name"]} [{_artist} - {song_info["album_name"]}:{song_info["release_year"]}].f{config.get("media_format")}',
+                        'quality': quality,
+                        'metadata': song_info,
+                        'image_url': song_info['image_url'],
+                        'raw': bool(config.get("force_raw")),
+                        'session_uuid': self.__session_uuid,
+                        'item': self.__current_item,
+                        'priority': self.__current_item.get('priority', PRIORITY_NORMAL)
+                    }
+                    if job['raw']:
                         self.logger.warning(
-                            f"Force raw is disabled for track by id '{trk_track_id_str}', "
-                            f"media converting and tagging will be done !"
+                            f"Force raw is enabled for track by id '{trk_track_id_str}', "
+                            f"media converting and tagging will be skipped !"
                         )
-                    self.logger.info(f"Downloaded track by id '{trk_track_id_str}'")
-                    if config.get('inp_enable_lyrics'):
-                        self.progress.emit([trk_track_id_str, "Getting Lyrics", None])
-                        self.logger.info(f'Fetching lyrics for track id: {trk_track_id_str}, '
-                                         f'{config.get("only_synced_lyrics")}')
-                        try:
-                            lyrics = get_track_lyrics(session, trk_track_id_str, song_info, config.get('only_synced_lyrics'))
-                            if lyrics:
-                                self.logger.info(f'Found lyrics for: {trk_track_id_str}, writing...')
-                                if config.get('use_lrc_file', 1):
-                                    with open(filename[0:-len(config.get('media_format'))] + 'lrc', 'w',
-                                              encoding='utf-8') as f:
-                                        f.write(lyrics)
-                                if config.get('embed_lyrics', 0):
-                                    set_audio_tags(filename, {'lyrics': lyrics}, trk_track_id_str)
-                                self.logger.info(f'lyrics saved for: {trk_track_id_str}')
-                        except Exception:
-                            self.logger.error(f'Could not get lyrics for {trk_track_id_str}, '
-                                              f'unexpected error: {traceback.format_exc()}')
-                    self.progress.emit([trk_track_id_str, "Downloaded", [100, 100],
-                                        filename,
-                                        f'{song_info["name"]} [{_artist} - {song_info["album_name"]}:{song_info["release_year"]}].f{config.get("media_format")}'])
+                        tagging_queue.put(job)
+                    elif streamed:
+                        tagging_queue.put(job)
+                    else:
+                        self.progress.emit([trk_track_id_str, "Waiting to convert", None])
+                        convert_queue.put(job)
                     return True
         except queue.Empty:
-            if os.path.exists(filename):
-                os.remove(filename)
+            self.__keep_partial(filename)
             self.logger.error(
                 f"Network timeout from spotify for track by id '{trk_track_id_str}', download will be retried !")
             self.progress.emit([trk_track_id_str, "Timeout. Will retry", None])
             return None
         except subprocess.CalledProcessError as exc:
-            if os.path.exists(filename):
-                os.remove(filename)
+            self.__discard_output(filename)
             self.logger.error(
                 f"Decoding error for track by id '{trk_track_id_str}', "
                 f"possibly due to use of rate limited spotify account ! {exc.returncode} | {exc.output}"
@@ -216,8 +353,7 @@ class DownloadWorker(QObject):
             traceback.print_exc()
             return None
         except Exception:
-            if os.path.exists(filename):
-                os.remove(filename)
+            self.__keep_partial(filename)
             self.progress.emit([trk_track_id_str, "Failed", None])
             self.logger.error(
                 f"Download failed for track by id '{trk_track_id_str}', Unexpected error: {traceback.format_exc()} !")
@@ -240,8 +376,11 @@ class DownloadWorker(QObject):
                 episode_id = EpisodeId.from_base62(episode_id_str)
                 stream = session.content_feeder().load(episode_id, VorbisOnlyAudioQuality(quality), False, None)
                 total_size = stream.input_stream.size
-                downloaded = 0
+                input_stream = stream.input_stream.stream()
                 _CHUNK_SIZE = config.get("chunk_size")
+                sizer = self.__chunk_sizer()
+                max_retries = config.get("max_retries")
+                part_sync_bytes = config.get("part_sync_bytes")
                 fail = 0
                 extension = config.get('podcast_media_format', 'mp3')
 
@@ -254,38 +393,50 @@ class DownloadWorker(QObject):
                 if os.path.isfile(file_path) and os.path.getsize(file_path) and skip_existing_file:
                     self.logger.info(f"Episode by id '{episode_id_str}', already exists.. Skipping ")
                     self.progress.emit([episode_id_str, "Downloaded", [100, 100], file_path, filename])
+                    try:
+                        library_index.add(episode_id_str, 'episode', file_path, filename)
+                    except Exception:
+                        self.logger.error(f"Could not add '{episode_id_str}' to library index: {traceback.format_exc()}")
                     return True
-                with open(file_path, 'wb') as file:
-                    while downloaded <= total_size:
-                        if episode_id_str in cancel_list:
-                            self.progress.emit([episode_id_str, "Cancelled", [0, 100]])
-                            cancel_list.pop(episode_id_str)
-                            self.__last_cancelled = True
-                            if os.path.exists(file_path):
-                                file.close()
-                                os.remove(file_path)
-                            return False
-                        data = stream.input_stream.stream().read(_CHUNK_SIZE)
-                        downloaded += len(data)
-                        file.write(data)
-                        self.progress.emit([episode_id_str, None, [downloaded, total_size], file_path, filename])
-                        if (total_size - downloaded) < _CHUNK_SIZE:
-                            _CHUNK_SIZE = total_size - downloaded
-                        if len(data) == 0:
-                            fail += 1
-                        if fail > config.get("max_retries"):
-                            self.progress.emit([episode_id_str, "RETRY " + str(fail + 1), None])
-                            break
+                streamed = bool(config.get('stream_transcode')) and extension not in ['ogg', 'wav']
+                downloaded = synced = self.__open_output(file_path, quality, stream, transcode=streamed)
+                while downloaded <= total_size:
+                    if episode_id_str in cancel_list:
+                        self.progress.emit([episode_id_str, "Cancelled", [0, 100]])
+                        cancel_list.pop(episode_id_str)
+                        self.__last_cancelled = True
+                        self.__discard_output(file_path)
+                        return False
+                    if sizer is not None:
+                        _CHUNK_SIZE = sizer.next(input_stream.pos(), total_size - downloaded)
+                    data = input_stream.read(_CHUNK_SIZE)
+                    if sizer is not None:
+                        sizer.update(len(data))
+                    downloaded += len(data)
+                    self.__write_output(data)
+                    self.progress.emit([episode_id_str, None, [downloaded, total_size], file_path, filename])
+                    if downloaded - synced >= part_sync_bytes:
+                        self.__sync_partial()
+                        synced = downloaded
+                    if (total_size - downloaded) < _CHUNK_SIZE:
+                        _CHUNK_SIZE = total_size - downloaded
+                    if len(data) == 0:
+                        fail += 1
+                    if fail > max_retries:
+                        self.progress.emit([episode_id_str, "RETRY " + str(fail + 1), None])
+                        break
                 if downloaded >= total_size:
-                    self.logger.info(f"Episode by id '{episode_id_str}', downloaded")
-                    if extension not in ['ogg', 'wav']:
+                    if streamed:
                         self.progress.emit([episode_id_str, "Converting", None, file_path, filename])
-                        convert_audio_format(file_path, quality)
-                    self.logger.info(f'Writing metadata for episode "{episode_id_str}" ')
-                    self.progress.emit([episode_id_str, "Writing metadata", None, file_path, filename])
-                    set_audio_tags(
-                        file_path,
-                        {
+                    self.__finish_output(file_path)
+                    self.logger.info(f"Episode by id '{episode_id_str}', downloaded")
+                    job = {
+                        'media_type': 'episode',
+                        'media_id': episode_id_str,
+                        'filename': file_path,
+                        'media_name': filename,
+                        'quality': quality,
+                        'metadata': {
                             'name': episode_name,
                             'album_name': podcast_name,
                             'release_year': release_date,
@@ -293,21 +444,26 @@ class DownloadWorker(QObject):
                             'artists': [artist],
                             'genre': ['Podcast']
                         },
-                        episode_id_str
-                    )
-                    self.progress.emit([episode_id_str, "Setting thumbnail", None, file_path, filename])
-                    self.logger.info(f'Setting thumbnail for episode "{episode_id_str}" ')
-                    set_music_thumbnail(file_path, thumbnail)
-                    self.progress.emit([episode_id_str, "Downloaded", [100, 100], file_path, filename])
+                        'image_url': thumbnail,
+                        'raw': False,
+                        'session_uuid': self.__session_uuid,
+                        'item': self.__current_item,
+                        'priority': self.__current_item.get('priority', PRIORITY_NORMAL)
+                    }
+                    if extension not in ['ogg', 'wav'] and not streamed:
+                        self.progress.emit([episode_id_str, "Waiting to convert", None, file_path, filename])
+                        convert_queue.put(job)
+                    else:
+                        tagging_queue.put(job)
                     return True
                 else:
+                    self.__keep_partial(file_path)
                     self.logger.error(
                         f"Downloading failed for episode by id '{episode_id_str}', partial download failed !")
                     self.progress.emit([episode_id_str, "Failed", [0, 100]])
                     return False
             except subprocess.CalledProcessError as exc:
-                if os.path.exists(file_path):
-                    os.remove(file_path)
+                self.__discard_output(file_path)
                 self.logger.error(
                     f"Decoding error for track by id '{episode_id_str}', "
                     f"possibly due to use of rate limited spotify account ! {exc.returncode} | {exc.output}"
@@ -316,6 +472,8 @@ class DownloadWorker(QObject):
                 traceback.print_exc()
                 return None
             except Exception:
+                if self.__output is not None:
+                    self.__keep_partial(file_path)
                 self.logger.error(
                     f"Downloading failed for episode by id "
                     f"'{episode_id_str}', Unexpected Exception: {traceback.format_exc()}"
@@ -336,16 +494,24 @@ class DownloadWorker(QObject):
             if self.__stop:
                 break
             attempt = 0
+            self.__current_item = item
             self.__last_cancelled = status = False
+            existing = find_downloaded(item['media_id'], item['media_type'], item['extra_path_as_root'])
+            if existing is not None:
+                # Indexed after the item was queued, e.g. by the library scan or a duplicate queue entry
+                self.logger.info(f"Media '{item['media_id']}' already exists at '{existing['path']}', skipping")
+                self.progress.emit([item['media_id'], "Already exists", [100, 100], existing['path'], existing['name']])
+                continue
             while attempt < config.get("max_retries") and status is not True and item is not None:
                 self.logger.info(f"Processing download for track by id '{item['media_id']}', Attempt: {attempt}/{config.get('max_retries')}")
                 attempt = attempt + 1
                 status = False
                 self.progress.emit([item['media_id'], "Downloading", None])
+                session = session_pool[self.__session_uuid]
                 try:
                     if item['media_type'] == "track":
                         status = self.download_track(
-                            session=session_pool[self.__session_uuid],
+                            session=session,
                             track_id_str=item['media_id'],
                             extra_paths=item['extra_paths'],
                             force_album_format=item['force_album_format'],
@@ -357,7 +523,7 @@ class DownloadWorker(QObject):
                         )
                     elif item['media_type'] == "episode":
                         status = self.download_episode(
-                            session=session_pool[self.__session_uuid],
+                            session=session,
                             episode_id_str=item['media_id'],
                             extra_paths=item['extra_paths'],
                             extra_path_as_root=item['extra_path_as_root'],
@@ -368,7 +534,8 @@ class DownloadWorker(QObject):
                         ConnectionResetError):
                     # Internet disconnected ?
                     self.logger.error(f'DL failed.. Connection error ! Trying to re init account session {self.__session_uuid} ! ')
-                    re_init_session(session_pool, self.__session_uuid, wait_connectivity=True, timeout=120)
+                    re_init_session(session_pool, self.__session_uuid, wait_connectivity=True, timeout=120,
+                                    failed_session=session)
 
                 if status is None:  # This needs to be cleaned up, current versions retry for False too
                     if attempt < config.get("max_retries"):  # 2 < 2
@@ -0,0 +1,25 @@
+import traceback
+from PyQt5.QtCore import QObject, pyqtSignal
+
+from ..otsconfig import config
+from ..runtimedata import get_logger
+from ..utils.library import library_index
+
+logger = get_logger("worker.library")
+
+
+# Indexes the download root in the background
+class LibraryScanner(QObject):
+    finished = pyqtSignal()
+    __stop = False
+
+    def run(self):
+        logger.info('Library scanner is running....')
+        try:
+            library_index.scan(config.get('download_root'), should_stop=lambda: self.__stop)
+        except Exception:
+            logger.error(f'Library scan failed, unexpected error: {traceback.format_exc()}')
+        self.finished.emit()
+
+    def stop(self):
+        self.__stop = True
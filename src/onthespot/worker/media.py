@@ -39,7 +39,7 @@ class MediaWatcher(QObject):
             except (OSError, queue.Empty, MaxRetryError, NewConnectionError, ConnectionError):
                 # Internet disconnected ?
                 logger.error('Search failed Connection error ! Trying to re init parsing account session ! ')
-                re_init_session(session_pool, selected_uuid, wait_connectivity=True, timeout=30)
+                re_init_session(session_pool, selected_uuid, wait_connectivity=True, timeout=30, failed_session=session)
         self.finished.emit()
 
     def stop(self):
@@ -0,0 +1,137 @@
+import os
+import queue
+import subprocess
+import traceback
+from PyQt5.QtCore import QObject, pyqtSignal
+
+from ..otsconfig import config
+from ..runtimedata import get_logger, failed_downloads, session_pool, download_queue
+from ..utils.library import library_index
+from ..utils.spotify import convert_audio_format, get_track_lyrics, TagWriter
+
+
+# Runs one post processing stage (convert or tag) on jobs from its input queue
+class PostProcessWorker(QObject):
+    finished = pyqtSignal()
+    progress = pyqtSignal(list)
+
+    name = None
+    logger = None
+    __stage = None
+    __queue_in = None
+    __queue_out = None
+    __stop = False
+    __stopped = False
+
+    def __convert(self, job):
+        self.progress.emit([job['media_id'], "Converting", None])
+        convert_audio_format(job['filename'], job['quality'])
+        return True
+
+    def __tag(self, job):
+        # Tags, artwork and embedded lyrics are collected first and written with a single save
+        media_id = job['media_id']
+        filename = job['filename']
+        writer = TagWriter(filename)
+        if job['media_type'] == 'episode':
+            self.logger.info(f'Collecting metadata and thumbnail for episode "{media_id}" ')
+            self.progress.emit([media_id, "Setting thumbnail", None, filename, job['media_name']])
+            writer.set_metadata(job['metadata'], media_id).set_artwork(job['image_url'])
+            self.progress.emit([media_id, "Writing metadata", None, filename, job['media_name']])
+            writer.commit()
+            return True
+        if not job['raw']:
+            self.progress.emit([media_id, "Setting thumbnail", None])
+            writer.set_metadata(job['metadata'], media_id).set_artwork(job['image_url'])
+        if config.get('inp_enable_lyrics'):
+            self.progress.emit([media_id, "Getting Lyrics", None])
+            self.logger.info(f'Fetching lyrics for track id: {media_id}, {config.get("only_synced_lyrics")}')
+            try:
+                lyrics = get_track_lyrics(session_pool[job['session_uuid']], media_id, job['metadata'],
+                                          config.get('only_synced_lyrics'))
+                if lyrics:
+                    self.logger.info(f'Found lyrics for: {media_id}, writing...')
+                    if config.get('use_lrc_file', 1):
+                        with open(os.path.splitext(filename)[0] + '.lrc', 'w', encoding='utf-8') as f:
+                            f.write(lyrics)
+                    if config.get('embed_lyrics', 0):
+                        writer.set_metadata({'lyrics': lyrics}, media_id)
+                    self.logger.info(f'lyrics saved for: {media_id}')
+            except Exception:
+                self.logger.error(f'Could not get lyrics for {media_id}, unexpected error: {traceback.format_exc()}')
+        self.progress.emit([media_id, "Writing metadata", None])
+        writer.commit()
+        return True
+
+    def __fail(self, job, status, retry):
+        if os.path.exists(job['filename']):
+            os.remove(job['filename'])
+        item = job['item']
+        if retry and item is not None and item.get('pp_retries', 0) < config.get('max_retries'):
+            # The streamed file was probably bad, send the item back for a fresh download
+            item = item.copy()
+            item['pp_retries'] = item.get('pp_retries', 0) + 1
+            self.progress.emit([job['media_id'], f"{status}. Will retry", None])
+            download_queue.put(item)
+        else:
+            self.progress.emit([job['media_id'], "Failed", [0, 100]])
+            if item is not None:
+                failed_downloads[job['media_id']] = item
+
+    def process(self, job):
+        self.logger.debug(f"Stage '{self.__stage}' processing '{job['media_id']}'")
+        try:
+            if self.__stage == 'convert':
+                self.__convert(job)
+            else:
+                self.__tag(job)
+        except subprocess.CalledProcessError as exc:
+            self.logger.error(
+                f"Decoding error for media by id '{job['media_id']}', "
+                f"possibly due to use of rate limited spotify account ! {exc.returncode} | {exc.output}"
+            )
+            self.__fail(job, "Decode error", retry=True)
+            return False
+        except Exception:
+            self.logger.error(
+                f"Stage '{self.__stage}' failed for media by id '{job['media_id']}', "
+                f"Unexpected error: {traceback.format_exc()} !")
+            self.__fail(job, "Failed", retry=False)
+            return False
+        if self.__queue_out is not None:
+            self.__queue_out.put(job)
+        else:
+            self.logger.info(f"Post processing done for media by id '{job['media_id']}'")
+            try:
+                library_index.add(job['media_id'], job['media_type'], job['filename'], job['media_name'])
+            except Exception:
+                # The file is done, a broken index only costs a later duplicate check
+                self.logger.error(f"Could not add '{job['media_id']}' to library index: {traceback.format_exc()}")
+            self.progress.emit([job['media_id'], "Downloaded", [100, 100], job['filename'], job['media_name']])
+        return True
+
+    def run(self):
+        self.logger.info(f"Post processing worker {self.name} is running ")
+        while not self.__stop:
+            try:
+                job = self.__queue_in.get(timeout=0.2)
+            except queue.Empty:
+                continue
+            self.process(job)
+        self.__stopped = True
+        self.logger.info(f"Post processing worker {self.name} is stopping ")
+        self.finished.emit()
+
+    def setup(self, thread_name, stage, queue_in, queue_out=None):
+        self.name = thread_name
+        self.__stage = stage
+        self.__queue_in = queue_in
+        self.__queue_out = queue_out
+        self.logger = get_logger(f"worker.postprocess.{thread_name}")
+
+    def stop(self):
+        self.logger.warning('Got signal to stop, signaling main func to stop right after current job')
+        self.__stop = True
+
+    def is_stopped(self):
+        return self.__stopped
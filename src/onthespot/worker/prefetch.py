@@ -0,0 +1,85 @@
+import queue
+import time
+import traceback
+from PyQt5.QtCore import QObject, pyqtSignal
+from urllib3.exceptions import MaxRetryError, NewConnectionError
+
+from ..otsconfig import config
+from ..runtimedata import get_logger, session_pool, download_queue, prefetched_metadata
+from ..utils.spotify import get_songs_info
+
+logger = get_logger("worker.prefetch")
+
+
+# Resolves song info for the next items in the download queue ahead of the workers
+class MetadataPrefetcher(QObject):
+    finished = pyqtSignal()
+    __stop = False
+
+    def __init__(self, parent=None):
+        super(MetadataPrefetcher, self).__init__(parent)
+        self.__failed = set()
+
+    def peek_queue(self, count):
+        return download_queue.peek(count)
+
+    def prune(self, wanted):
+        # Drop results for items that left the queue without being used, e.g. cancelled or downloaded by a
+        # worker before the prefetch finished
+        expiry = time.time() - 300
+        for media_id in list(prefetched_metadata.keys()):
+            entry = prefetched_metadata.get(media_id)
+            if entry is not None and media_id not in wanted and entry['time'] < expiry:
+                prefetched_metadata.pop(media_id, None)
+
+    def run(self):
+        logger.info('Metadata prefetcher is running....')
+        while not self.__stop:
+            count = config.get('metadata_prefetch_count')
+            if count <= 0:
+                time.sleep(2)
+                continue
+            items = [item for item in self.peek_queue(count) if item.get('media_type') == 'track']
+            wanted = set(item['media_id'] for item in items)
+            self.prune(wanted)
+            # Items that failed once are left to the download worker
+            self.__failed.intersection_update(wanted)
+            pending = [item['media_id'] for item in items
+                       if item['media_id'] not in prefetched_metadata and item['media_id'] not in self.__failed]
+            if len(pending) == 0:
+                time.sleep(0.5)
+                continue
+            try:
+                selected_uuid = config.get('accounts')[config.get('parsing_acc_sn') - 1][3]
+                session = session_pool[selected_uuid]
+            except (IndexError, KeyError):
+                logger.warning("Sessions not available yet !")
+                time.sleep(5)
+                continue
+            logger.debug(f'Prefetching metadata for tracks {pending}')
+            try:
+                # All pending tracks share the same track, album and artist requests
+                songs_info = get_songs_info(session, pending)
+                for media_id in pending:
+                    if media_id not in songs_info:
+                        self.__failed.add(media_id)
+                        continue
+                    prefetched_metadata[media_id] = {
+                        'time': time.time(),
+                        'info': songs_info[media_id]
+                    }
+            except (OSError, queue.Empty, MaxRetryError, NewConnectionError, ConnectionError):
+                logger.error('Metadata prefetch failed.. Connection error ! Workers will fetch metadata themselves')
+                time.sleep(5)
+                continue
+            except Exception:
+                logger.error(f'Metadata prefetch failed for tracks {pending}, '
+                             f'unexpected error: {traceback.format_exc()}')
+                self.__failed.update(pending)
+            # Stay well below the web api rate limit, the workers need it too
+            time.sleep(config.get('metadata_prefetch_delay'))
+        logger.warning('Metadata prefetcher is stopping !')
+        self.finished.emit()
+
+    def stop(self):
+        self.__stop = True
@@ -0,0 +1,63 @@
+import threading
+from PyQt5.QtCore import QObject, pyqtSignal
+
+from ..otsconfig import config
+from ..runtimedata import get_logger
+
+logger = get_logger("worker.progress")
+
+
+# Coalesces worker progress reports and hands them to the GUI in batches
+class ProgressAggregator(QObject):
+    batch = pyqtSignal(list)
+    finished = pyqtSignal()
+    __stop = False
+
+    def __init__(self, parent=None):
+        super(ProgressAggregator, self).__init__(parent)
+        self.__lock = threading.Lock()
+        self.__wake = threading.Event()
+        # Reports in arrival order, progress values are replaced in place while no status of the same media
+        # item came after them
+        self.__pending = []
+        self.__progress_slot = {}
+
+    def update(self, data):
+        with self.__lock:
+            if data[1] is None:
+                # Only the latest progress value of a media item matters
+                slot = self.__progress_slot.get(data[0])
+                if slot is None:
+                    self.__progress_slot[data[0]] = len(self.__pending)
+                    self.__pending.append(data)
+                else:
+                    self.__pending[slot] = data
+            else:
+                # Later progress values must not move ahead of this status
+                self.__progress_slot.pop(data[0], None)
+                self.__pending.append(data)
+                self.__wake.set()
+
+    def flush(self):
+        with self.__lock:
+            self.__wake.clear()
+            if not self.__pending:
+                return False
+            pending = self.__pending
+            self.__pending = []
+            self.__progress_slot = {}
+        self.batch.emit(pending)
+        return True
+
+    def run(self):
+        logger.info('Progress aggregator is running....')
+        interval = 1 / max(1, config.get('progress_update_rate'))
+        while not self.__stop:
+            self.__wake.wait(interval)
+            self.flush()
+        self.flush()
+        self.finished.emit()
+
+    def stop(self):
+        self.__stop = True
+        self.__wake.set()
@@ -1,6 +1,8 @@
+import itertools
 import os
 import queue
 import time
+from concurrent.futures import ThreadPoolExecutor
 from PyQt5.QtCore import QObject, pyqtSignal
 from urllib3.exceptions import MaxRetryError, NewConnectionError
 
@@ -8,6 +10,7 @@ from ..otsconfig import config
 from ..runtimedata import get_logger, playlist_m3u_queue, downloaded_data, session_pool, unavailable
 from ..utils.spotify import get_album_tracks, get_album_name, get_artist_albums, get_show_episodes, get_episode_info, \
     get_song_info, get_tracks_from_playlist, get_playlist_data, sanitize_data
+from ..utils.stagequeue import PRIORITY_INTERACTIVE, PRIORITY_NORMAL, PRIORITY_BULK
 from ..utils.utils import re_init_session
 
 logger = get_logger("worker.utility")
@@ -57,18 +60,27 @@ class PlayListMaker(QObject):
         self.__stop = True
 
 
+# Shared by all parsing workers for the albums of an artist and the episodes of a show
+album_parse_pool = ThreadPoolExecutor(max_workers=max(1, config.get('parsing_threads')),
+                                      thread_name_prefix='PQP_ALBUM')
+
+
+# Several processors share the parsing queue, each item is parsed by one of them
 class ParsingQueueProcessor(QObject):
     finished = pyqtSignal()
     progress = pyqtSignal(str)
-    enqueue = pyqtSignal(dict)
+    enqueue = pyqtSignal(list)
+    name = None
     __queue = None
     __stop = True
 
     def enqueue_tracks(self, track_list, enqueue_part_cfg, log_id='', item_type=''):
+        # One signal per page of tracks, the main window adds the whole batch of rows at once
+        items = []
         for track in track_list:
             logger.info(f'PQP parsing {log_id} <-> track item: {track["name"]}:{track["id"]}')
             exp = '[ E ]' if track['explicit'] else ''
-            self.enqueue.emit(
+            items.append(
                 {
                     'item_id': track['id'],
                     'item_title': f'{exp} {track["name"]}',
@@ -82,12 +94,20 @@ class ParsingQueueProcessor(QObject):
                         'playlist_owner': enqueue_part_cfg.get('playlist_owner', ''),
                         'playlist_desc': enqueue_part_cfg.get('playlist_desc', ''),
                         'force_album_after_extra_path_as_root': enqueue_part_cfg.get('force_album_after_extra_path_as_root', False),
+                        'priority': enqueue_part_cfg.get('priority', PRIORITY_NORMAL),
+                        'parent_id': enqueue_part_cfg.get('parent_id', '')
                     }
                 }
             )
+        if items:
+            self.enqueue.emit(items)
+
+    def __start_album(self, session, album_id):
+        pages = get_album_tracks(session, album_id)
+        return get_album_name(session, album_id), next(pages, []), pages
 
     def run(self):
-        logger.info('Parsing queue processor is active !')
+        logger.info(f'Parsing queue processor {self.name} is active !')
         while not self.__stop:
             logger.info('Waiting for new item to parse')
             item = self.__queue.get()
@@ -99,7 +119,15 @@ class ParsingQueueProcessor(QObject):
                 enqueue_part_cfg = {
                         'extra_paths': item['data'].get('dl_path', ''),
                         'extra_path_as_root': item['data'].get('dl_path_is_root', False),
-                        'force_album_after_extra_path_as_root': item['data'].get('force_album_after_extra_path_as_root', False)
+                        'force_album_after_extra_path_as_root': item['data'].get('force_album_after_extra_path_as_root', False),
+                        # Single tracks and episodes were asked for directly, whole discographies can wait
+                        'priority': {
+                            'track': PRIORITY_INTERACTIVE,
+                            'episode': PRIORITY_INTERACTIVE,
+                            'artist': PRIORITY_BULK
+                        }.get(item['media_type'], PRIORITY_NORMAL),
+                        # Items of one playlist, album, artist or show share a turn in the download queue
+                        'parent_id': f"{item['media_type']}:{item['media_id']}"
                 }                
                 if item['media_type'] == 'album':
                     artist, album_release_date, album_name, total_tracks = get_album_name(session, item['media_id'])
@@ -108,11 +136,11 @@ class ParsingQueueProcessor(QObject):
                         self.progress.emit(
                             f'Tracks in album "{item_name}" is being parsed and will be added to download queue shortly !'
                         )
-                    tracks = get_album_tracks(session, item['media_id'])
                     logger.info("Passing control to track downloader.py for album tracks downloading !!")
-                    self.enqueue_tracks(tracks, enqueue_part_cfg=enqueue_part_cfg,
-                                        log_id=f'{album_name}:{item["media_id"]}',
-                                        item_type=f"Album [{album_release_date}][{album_name}]")
+                    for tracks in get_album_tracks(session, item['media_id']):
+                        self.enqueue_tracks(tracks, enqueue_part_cfg=enqueue_part_cfg,
+                                            log_id=f'{album_name}:{item["media_id"]}',
+                                            item_type=f"Album [{album_release_date}][{album_name}]")
                     if not item['data'].get('hide_dialogs', False):
                         self.progress.emit(
                             f"Added album '[{album_release_date}] [{total_tracks}] {album_name}' to download queue !"
@@ -124,40 +152,54 @@ class ParsingQueueProcessor(QObject):
                             f"All albums by {item_name} is being parsed and will be added to download queue soon!"
                         )
                     albums = get_artist_albums(session, item['media_id'])
-                    for album_id in albums:
-                        artist, album_release_date, album_name, total_tracks = get_album_name(session, album_id)
+                    # Album names and first track pages are fetched concurrently, map keeps the album order.
+                    # Every page is enqueued as soon as it is read, later pages of an album are read here.
+                    parsed_albums = album_parse_pool.map(
+                        lambda album_id: self.__start_album(session, album_id),
+                        albums
+                    )
+                    for (artist, album_release_date, album_name, total_tracks), first_page, pages in parsed_albums:
                         item_name = artist
-                        tracks = get_album_tracks(session, album_id)
                         logger.info("Passing control to track downloader.py for album artist downloading !!")
-                        self.enqueue_tracks(tracks, enqueue_part_cfg=enqueue_part_cfg,
-                                            log_id=f'{artist}:{item["media_id"]}', item_type=f"Artist [{item_name}]")
+                        for tracks in itertools.chain([first_page], pages):
+                            self.enqueue_tracks(tracks, enqueue_part_cfg=enqueue_part_cfg,
+                                                log_id=f'{artist}:{item["media_id"]}',
+                                                item_type=f"Artist [{item_name}]")
                     if not item['data'].get('hide_dialogs', False):
                         self.progress.emit(f"Added tracks by artist '{item_name}' to download queue !")
                 elif item['media_type'] == 'podcast':
                     show_name = ''
                     if not item['data'].get('hide_dialogs', False):
                         self.progress.emit('Episodes are being parsed and will be added to download queue shortly !')
-                    for episode_id in get_show_episodes(session, item['media_id']):
-                        show_name, episode_name, thumbnail, release_date, total_episodes, artist = get_episode_info(session, episode_id)
-                        logger.info(
-                            f"PQP parsing podcast : {show_name}:{item['media_id']}, "
-                            f"episode item: {episode_name}:{episode_id}"
-                        )
-                        # TODO: Use new enqueue method
-                        self.enqueue.emit(
-                            {
-                                'item_id': episode_id,
-                                'item_title': episode_name,
-                                'item_by_text': '',
-                                'item_type_text': f"Podcast [{show_name}]",
-                                'dl_params': {
-                                    'media_type': 'episode',
-                                    'extra_paths': item['data'].get('dl_path', ''),
-                                    'extra_path_as_root': item['data'].get('dl_path_is_root', False),
-                                    'force_album_after_extra_path_as_root': enqueue_part_cfg.get('force_album_after_extra_path_as_root', False)
+                    for episode_ids in get_show_episodes(session, item['media_id']):
+                        episodes_info = album_parse_pool.map(lambda episode_id: get_episode_info(session, episode_id),
+                                                             episode_ids)
+                        episode_items = []
+                        for episode_id, episode_info in zip(episode_ids, episodes_info):
+                            show_name, episode_name, thumbnail, release_date, total_episodes, artist = episode_info
+                            logger.info(
+                                f"PQP parsing podcast : {show_name}:{item['media_id']}, "
+                                f"episode item: {episode_name}:{episode_id}"
+                            )
+                            # TODO: Use new enqueue method
+                            episode_items.append(
+                                {
+                                    'item_id': episode_id,
+                                    'item_title': episode_name,
+                                    'item_by_text': '',
+                                    'item_type_text': f"Podcast [{show_name}]",
+                                    'dl_params': {
+                                        'media_type': 'episode',
+                                        'extra_paths': item['data'].get('dl_path', ''),
+                                        'extra_path_as_root': item['data'].get('dl_path_is_root', False),
+                                        'force_album_after_extra_path_as_root': enqueue_part_cfg.get('force_album_after_extra_path_as_root', False),
+                                        'priority': enqueue_part_cfg['priority'],
+                                        'parent_id': enqueue_part_cfg['parent_id']
+                                    }
                                 }
-                            }
-                        )
+                            )
+                        if episode_items:
+                            self.enqueue.emit(episode_items)
                     if not item['data'].get('hide_dialogs', False):
                         self.progress.emit(f"Added show '{show_name}' to download queue!")
                 elif item['media_type'] == 'episode':
@@ -166,7 +208,7 @@ class ParsingQueueProcessor(QObject):
                     if not item['data'].get('hide_dialogs', False):
                         self.progress.emit(f"Adding episode '{episode_name}' of '{podcast_name}' to download queue !")
                     # TODO: Use new enqueue method
-                    self.enqueue.emit(
+                    self.enqueue.emit([
                         {
                             'item_id': item['media_id'],
                             'item_title': episode_name,
@@ -176,10 +218,12 @@ class ParsingQueueProcessor(QObject):
                                 'media_type': 'episode',
                                 'extra_paths': item['data'].get('dl_path', ''),
                                 'extra_path_as_root': item['data'].get('dl_path_is_root', False),
-                                'force_album_after_extra_path_as_root': enqueue_part_cfg.get('force_album_after_extra_path_as_root', False)
+                                'force_album_after_extra_path_as_root': enqueue_part_cfg.get('force_album_after_extra_path_as_root', False),
+                                'priority': enqueue_part_cfg['priority'],
+                                'parent_id': enqueue_part_cfg['parent_id']
                             }
                         }
-                    )
+                    ])
                     if not item['data'].get('hide_dialogs', False):
                         self.progress.emit(f"Added episode '{episode_name}' of {podcast_name} to download queue!")
                 elif item['media_type'] == "playlist":
@@ -191,14 +235,24 @@ class ParsingQueueProcessor(QObject):
                             f"Tracks in playlist '{item_name}' by {owner} is being parsed and "
                             f"will be added to download queue shortly!"
                         )
-                    playlist_songs = get_tracks_from_playlist(session,
-                                                              item['media_id'])
                     enqueue_part_cfg.update({
                         'playlist_name': name,
                         'playlist_owner': owner,
                         'playlist_desc': description
                     })
+                    # Pages already enqueued before a connection error are not read again when the item is retried
+                    resume = item.setdefault('resume', {'url': None, 'track_ids': []})
+                    playlist_track_ids = resume['track_ids']
+                    for playlist_songs, next_url in get_tracks_from_playlist(session, item['media_id'],
+                                                                             start_url=resume['url']):
+                        page_tracks = [song['track'] for song in playlist_songs if song['track']['id'] is not None]
+                        if enable_m3u:
+                            playlist_track_ids.extend(track['id'] for track in page_tracks)
+                        self.enqueue_tracks(page_tracks, enqueue_part_cfg=enqueue_part_cfg,
+                                            log_id=f'{item_name}:{item["media_id"]}', item_type=f"Playlist [{name}]")
+                        resume['url'] = next_url
                     if enable_m3u:
+                        # Registered once every page is enqueued, the m3u maker must not see a partial track list
                         playlist_m3u_queue[item['media_id']] = {
                             'filename': os.path.abspath(
                                 os.path.join(
@@ -206,14 +260,8 @@ class ParsingQueueProcessor(QObject):
                                     config.get('playlist_name_formatter').format(name=name, owner=owner,
                                                                                  description=description) + ".m3u8")
                             ),
-                            'tracks': []
+                            'tracks': playlist_track_ids
                         }
-                    for song in playlist_songs:
-                        if song['track']['id'] is not None:
-                            if enable_m3u:
-                                playlist_m3u_queue[item['media_id']]['tracks'].append(song['track']['id'])
-                            self.enqueue_tracks([song['track']], enqueue_part_cfg=enqueue_part_cfg,
-                                                log_id=f'{item_name}:{item["media_id"]}', item_type=f"Playlist [{name}]")
                     if not item['data'].get('hide_dialogs', False):
                         self.progress.emit(f"Added playlist '{item_name}' by {owner} to download queue !")
                 elif item['media_type'] == 'track':
@@ -235,10 +283,11 @@ class ParsingQueueProcessor(QObject):
             except (OSError, queue.Empty, MaxRetryError, NewConnectionError, ConnectionError):
                 # Internet disconnected ?
                 logger.error('Item parsing failed.. Connection error ! Trying to re init parsing account session ! ')
-                re_init_session(session_pool, selected_uuid, wait_connectivity=True, timeout=60)
+                re_init_session(session_pool, selected_uuid, wait_connectivity=True, timeout=60, failed_session=session)
                 self.__queue.put(item)
         logger.warning('Parsing queue processor is stopping !')
 
-    def setup(self, queue):
+    def setup(self, queue, name='PQP'):
+        self.name = name
         self.__queue = queue
         self.__stop = 0